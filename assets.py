@@ -0,0 +1,70 @@
+import base64
+import hashlib
+import io
+import mimetypes
+import os
+from functools import cached_property
+
+from PIL import Image
+
+# Widest image st.image shows as is. Wider ones are resized and encoded again on every call
+max_width = 1460
+
+
+# Image bytes no wider than width, in the same format. Resized like st.image would resize them
+def fit_width(data, width):
+    image = Image.open(io.BytesIO(data))
+    if image.width <= width:
+        return data
+    format = image.format
+    image = image.resize((width, int(image.height * width / image.width)), resample=Image.BILINEAR)
+    resized = io.BytesIO()
+    image.save(resized, format=format)
+    return resized.getvalue()
+
+
+# One image file, read once. digest versions its static URL
+class Asset:
+    def __init__(self, path, mime, data, width=max_width):
+        self.path = path
+        self.mime = mime
+        self.data = data
+        self.width = width
+        self.digest = hashlib.sha256(data).hexdigest()[:16]
+        self.data_uri = f'data:{mime};base64,' + base64.b64encode(data).decode('utf-8')
+
+    # The image resized to at most width, once, on first use. st.image passes it on
+    # without decoding it again
+    @cached_property
+    def display(self):
+        return fit_width(self.data, self.width)
+
+
+# Every image of a directory, read and encoded once per process. With static serving
+# images are referred to by versioned URLs that browsers cache for good, as a new
+# version of an image gets a new URL. Otherwise they are inlined as data URIs
+class AssetRegistry:
+    def __init__(self, directory, static=False, base_url=''):
+        self.static = static
+        self.prefix = '/' + '/'.join(part for part in [base_url.strip('/'), 'app', 'static'] if part)
+        self._assets = {}
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            mime = mimetypes.guess_type(name)[0]
+            if os.path.isfile(path) and mime and mime.startswith('image/'):
+                with open(path, 'rb') as f:
+                    self._assets[name] = Asset(path, mime, f.read())
+
+    def __getitem__(self, name):
+        return self._assets[name]
+
+    # Image bytes resized to display width, for st.image
+    def data(self, name):
+        return self._assets[name].display
+
+    # URL of an image for components, versioned static URL or data URI
+    def url(self, name):
+        asset = self._assets[name]
+        if self.static:
+            return f'{self.prefix}/{name}?v={asset.digest}'
+        return asset.data_uri
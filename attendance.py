@@ -0,0 +1,104 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+# Number of set bits in every byte value
+_popcount = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+# Attendance grid held as packed bit masks, one bit per student per session, with one
+# list of session headers shared by all students. Cells neither 'P' nor 'A' are invalid
+class AttendanceMatrix:
+    def __init__(self, present, absent, headers, rows):
+        self.present = present
+        self.absent = absent
+        self.headers = headers
+        self.rows = rows
+
+    @classmethod
+    def from_grid(cls, grid):
+        values = grid.to_numpy(dtype=object)
+        headers = tuple(str(header) for header in grid.columns)
+        return cls(np.packbits(values == 'P', axis=1), np.packbits(values == 'A', axis=1), headers, len(grid))
+
+    def __len__(self):
+        return self.rows
+
+    # Packed mask of the sessions whose header passes select, or of every session
+    def _columns(self, select=None):
+        selected = np.array([select is None or select(header) for header in self.headers], dtype=bool)
+        return np.packbits(selected)
+
+    # Per student counts of attended, marked and invalid sessions, among selected ones
+    def counts(self, select=None):
+        columns = self._columns(select)
+        attended = _popcount[self.present & columns].sum(axis=1, dtype=np.int64)
+        marked = _popcount[(self.present | self.absent) & columns].sum(axis=1, dtype=np.int64)
+        invalid = int(_popcount[columns].sum()) - marked
+        return attended, marked, invalid
+
+    def unpack(self, mask):
+        return np.unpackbits(mask, axis=1, count=len(self.headers)).astype(bool)
+
+    # Bytes held by the masks and headers
+    @property
+    def nbytes(self):
+        return self.present.nbytes + self.absent.nbytes + sum(sys.getsizeof(header) for header in self.headers)
+
+
+# Summary columns, one row per student indexed by roll number
+summary_columns = ['conducted', 'attended', 'total', 'errors', 'percentage', 'overview', 'absences']
+
+
+# Attendance of every student in an attendance matrix. Each attended or missed session
+# counts weight times. Sessions whose header ends with bonus_suffix count once more.
+# A grid headed by 'E' has no sessions conducted yet. Sheets leaves trailing blank rows
+# out of a grid, so students past its last row, up to students, get rows with no sessions
+def summarize_grid(matrix, first_roll=1, weight=1, bonus_suffix=None, students=None):
+    rolls = pd.RangeIndex(first_roll, first_roll + max(len(matrix), students or 0), name='Roll No')
+    headers = matrix.headers
+    if not headers or headers[0] == 'E':
+        empty = {'conducted': False, 'attended': 0, 'total': 0, 'errors': 0,
+                 'percentage': np.nan, 'overview': '', 'absences': [[] for roll in rolls]}
+        return pd.DataFrame(empty, index=rolls, columns=summary_columns)
+
+    attended, total, errors = matrix.counts()
+    attended = attended * weight
+    total = total * weight
+    if bonus_suffix is not None:
+        bonus = matrix.counts(lambda header: header[-len(bonus_suffix):] == bonus_suffix)
+        attended = attended + bonus[0]
+        total = total + bonus[1]
+        errors = errors + bonus[2]
+
+    # Overview strings and absence lists. Absences are numbered by the student's own sessions
+    present = matrix.unpack(matrix.present)
+    absent = matrix.unpack(matrix.absent)
+    marked = present | absent
+    marks = np.where(present, '✅', np.where(absent, '🆎', ''))
+    overview = [''.join(row) for row in marks]
+    serial = marked.cumsum(axis=1)
+    absences = [[] for row in range(len(matrix))]
+    for row, column in zip(*np.nonzero(absent)):
+        absences[row].append(f'{serial[row, column]} | {headers[column]}')
+
+    percentage = [round(100 * a / t, 2) if t > 0 else np.nan for a, t in zip(attended.tolist(), total.tolist())]
+    # Students past the last row of the grid have no sessions
+    missing = len(rolls) - len(matrix)
+    if missing:
+        attended, total, errors = (np.concatenate([column, np.zeros(missing, dtype=np.int64)])
+                                   for column in (attended, total, errors))
+        percentage += [np.nan] * missing
+        overview += [''] * missing
+        absences += [[] for row in range(missing)]
+    return pd.DataFrame({'conducted': True, 'attended': attended, 'total': total, 'errors': errors,
+                         'percentage': percentage, 'overview': overview, 'absences': absences},
+                        index=rolls, columns=summary_columns)
+
+
+# Attendance of every student across consecutive batch matrices of batch_size students each
+def summarize_batches(matrices, batch_size=50, **rules):
+    return pd.concat([summarize_grid(matrix, 1 + index * batch_size, students=batch_size, **rules)
+                      for index, matrix in enumerate(matrices)])
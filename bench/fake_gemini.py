@@ -0,0 +1,59 @@
+import random
+import threading
+import time
+
+# Local stand-in for the Gemini model endpoint, with the signature of gemini_generate.
+# Calls can be slowed down, can fail with 429 errors at random, and fail with 429 errors
+# when a key goes over its own rate. Like the provider, each key may send a burst of rate
+# requests, then rate requests per `per` seconds
+
+
+# 429 of the fake endpoint, recognized by is_quota_error like the client library's
+class ResourceExhausted(Exception):
+    def __init__(self, message):
+        super().__init__(f'429 {message}')
+        self.code = 429
+
+
+class FakeModel:
+    def __init__(self, latency=0.0, quota_rate=0.0, rate=None, per=60, seed=1):
+        self.latency = latency
+        self.quota_rate = quota_rate
+        self.rate = rate
+        self.per = per
+        self.calls = 0
+        self.quota_errors = 0
+        self.over_rate = 0
+        self.calls_by_key = {}
+        self._tokens = {}
+        self._started = time.monotonic()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    # Count a call of key and decide whether it fails, before the latency
+    def _admit(self, name):
+        now = time.monotonic()
+        with self._lock:
+            self.calls += 1
+            self.calls_by_key[name] = self.calls_by_key.get(name, 0) + 1
+            if self.rate is not None:
+                tokens, since = self._tokens.get(name, (float(self.rate), self._started))
+                tokens = min(float(self.rate), tokens + (now - since) * self.rate / self.per)
+                if tokens < 1:
+                    self._tokens[name] = (tokens, now)
+                    self.quota_errors += 1
+                    self.over_rate += 1
+                    return 'Quota exceeded for requests per minute of this API key'
+                self._tokens[name] = (tokens - 1, now)
+            if self._random.random() < self.quota_rate:
+                self.quota_errors += 1
+                return 'Resource has been exhausted (e.g. check quota).'
+        return None
+
+    def generate(self, name, query):
+        refused = self._admit(name)
+        if self.latency:
+            time.sleep(self.latency)
+        if refused:
+            raise ResourceExhausted(refused)
+        return f'Feedback for a prompt of {len(query)} characters'
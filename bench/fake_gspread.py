@@ -0,0 +1,207 @@
+import random
+import re
+import threading
+import time
+
+import pandas as pd
+from gspread.exceptions import APIError
+from gspread.utils import a1_range_to_grid_range
+
+# Local stand-in for the gspread client, serving a synthetic cohort laid out like the
+# department's spreadsheet. Calls can be slowed down and can fail with 429 errors
+
+
+# Assessments of the Scores worksheet, in sheet order
+score_columns = ['Aggregate', 'Theory Total', 'Theory IA', 'Theory FA', 'Theory 1', 'Theory 2', 'Theory 3',
+                 'Viva 1', 'Viva 2', 'MCQ 1', 'MCQ 2', 'MCQ 3', 'Seminar', 'Th Professionalism',
+                 'Practical Total', 'Practical IA', 'Practical FA', 'Practical 1', 'Practical 2', 'Practical 3',
+                 'Class Test 1', 'Class Test 2', 'Class Test 3',
+                 'Record', 'Skill Certification', 'ECE', 'Assignment', 'Pr Professionalism']
+
+houses = ['Blackburn', 'Adelbert', 'Langendorff', 'Landsteiner', 'Sherrington']
+
+
+# One attendance mark: P, A, or a blank cell left by mistake
+def mark(rnd, absent, blank):
+    x = rnd.random()
+    if x < blank:
+        return ''
+    return 'A' if x < blank + absent else 'P'
+
+
+def theory_header(column):
+    return f'2025-{column // 28 % 12 + 1:02d}-{column % 28 + 1:02d} | {9 + column % 5:02d}-{10 + column % 5:02d}'
+
+
+def practical_header(column):
+    session = 'ECE' if column % 7 == 0 else 'SGD'
+    return f'2025-{column // 28 % 12 + 1:02d}-{column % 28 + 1:02d} | 14-16 | S{column} {session}'
+
+
+def aetcom_header(column):
+    return f'2025-{column // 28 % 12 + 1:02d}-{column % 28 + 1:02d} | Module {column}'
+
+
+# Attendance grid of any size, as the frame df_with_header makes of a worksheet range
+def attendance_frame(students, columns, header=theory_header, absent=0.14, blank=0.01, seed=1):
+    rnd = random.Random(seed)
+    rows = [[mark(rnd, absent, blank) for column in range(columns)] for student in range(students)]
+    return pd.DataFrame(rows, columns=[header(column) for column in range(columns)])
+
+
+# Scores of any number of students, followed by a row of maximum scores, as numbers
+def scores_frame(students, seed=1):
+    rnd = random.Random(seed)
+    rows = [[rnd.randint(20, 99) for column in score_columns] for student in range(students)]
+    rows.append([100] * len(score_columns))
+    return pd.DataFrame(rows, columns=score_columns)
+
+
+# Cells of the department's spreadsheet for a cohort of 250 students, as {worksheet: {(row, column): value}}.
+# Attendance has columns date columns, up to the 200 the app reads
+def workbook(columns=120, absent=0.14, blank=0.01, seed=1):
+    rnd = random.Random(seed)
+    cells = {}
+
+    def put(sheet, row, column, value):
+        cells.setdefault(sheet, {})[(row, column)] = value
+
+    for j, header in enumerate(['House', 'Attendance', 'Scores', 'Bonus', 'Total', 'Rank']):
+        put('Houses', 1, 1 + j, header)
+    for i, house in enumerate(houses):
+        for j, value in enumerate([house, '300', '250', '100', str(650 - i * 10), str(i + 1)]):
+            put('Houses', 2 + i, 1 + j, value)
+
+    for j, header in enumerate(['Name', 'Reg No', 'Access']):
+        put('Eligibility', 1, 2 + j, header)
+    for r in range(250):
+        for j, value in enumerate([f'student {r + 1}', f'REG{r + 1:04d}', 'YES']):
+            put('Eligibility', 2 + r, 2 + j, value)
+
+    for c in range(columns):
+        put('Theory', 1, 4 + c, theory_header(c))
+        for r in range(250):
+            put('Theory', 2 + r, 4 + c, mark(rnd, absent, blank))
+    for sheet, header in [('Practical', practical_header), ('AETCOM', aetcom_header)]:
+        for top in [2, 55, 108, 161, 214]:
+            for c in range(columns // 2):
+                put(sheet, top, 4 + c, header(c))
+                for r in range(50):
+                    put(sheet, top + 1 + r, 4 + c, mark(rnd, absent, blank))
+
+    for j, header in enumerate(score_columns):
+        put('Scores', 2, 2 + j, header)
+    for r in range(251):
+        for j, header in enumerate(score_columns):
+            pending = header in ('Theory 3', 'Practical 3')
+            value = '100' if r == 250 else ('0' if pending else str(rnd.randint(20, 99)))
+            put('Scores', 3 + r, 2 + j, value)
+    put('Scores', 255, 2, 'Scores updated for (Theory 1, Viva 1, MCQ 1) and (Practical 1, Class Test 1)')
+
+    for j, header in enumerate(['Roll No', 'Bonus', 'Reason', 'Date']):
+        put('House Point History', 9, 1 + j, header)
+    for r in range(30):
+        for j, value in enumerate([str(rnd.randint(1, 250)), str(rnd.choice([5, 10, -5])), 'quiz', '2025-01-01']):
+            put('House Point History', 10 + r, 1 + j, value)
+    return cells
+
+
+# Values of an A1 range, trimmed of trailing blank cells and rows like the Sheets API
+def read_range(cells, a1):
+    grid = a1_range_to_grid_range(a1)
+    top, left = grid['startRowIndex'] + 1, grid['startColumnIndex'] + 1
+    bottom, right = grid.get('endRowIndex', top), grid.get('endColumnIndex', left)
+    rows = []
+    for r in range(top, bottom + 1):
+        row = [cells.get((r, c), '') for c in range(left, right + 1)]
+        while row and row[-1] == '':
+            row.pop()
+        rows.append(row)
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+
+# Response of a failed Sheets API call
+class FakeResponse:
+    def __init__(self, status_code, message):
+        self.status_code = status_code
+        self.text = message
+
+    def json(self):
+        return {'error': {'code': self.status_code, 'message': self.text, 'status': 'RESOURCE_EXHAUSTED'}}
+
+
+# Counts, delays and fails calls. Each call sleeps latency seconds, and fails with a
+# 429 error with probability quota_rate
+class Backend:
+    def __init__(self, cells, latency=0.0, quota_rate=0.0, seed=1):
+        self.cells = cells
+        self.latency = latency
+        self.quota_rate = quota_rate
+        self.modified = '2025-01-01T00:00:00.000Z'
+        self.calls = 0
+        self.quota_errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def call(self):
+        with self._lock:
+            self.calls += 1
+            failed = self._random.random() < self.quota_rate
+            if failed:
+                self.quota_errors += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if failed:
+            raise APIError(FakeResponse(429, 'Quota exceeded for quota metric Read requests per minute'))
+
+
+class FakeWorksheet:
+    def __init__(self, backend, title):
+        self.backend = backend
+        self.title = title
+
+    def get(self, a1):
+        self.backend.call()
+        return read_range(self.backend.cells[self.title], a1)
+
+    def batch_get(self, ranges):
+        self.backend.call()
+        return [read_range(self.backend.cells[self.title], a1) for a1 in ranges]
+
+
+class FakeSpreadsheet:
+    def __init__(self, backend):
+        self.backend = backend
+        self.id = 'fake-spreadsheet'
+
+    def worksheet(self, title):
+        self.backend.call()
+        return FakeWorksheet(self.backend, title)
+
+    def values_batch_get(self, ranges, params=None):
+        self.backend.call()
+        value_ranges = []
+        for name in ranges:
+            sheet, a1 = re.match(r"'(.*)'!(.*)", name).groups()
+            values = read_range(self.backend.cells[sheet], a1)
+            value_ranges.append({'range': name, 'values': values} if values else {'range': name})
+        return {'spreadsheetId': self.id, 'valueRanges': value_ranges}
+
+
+class FakeClient:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def open(self, title):
+        self.backend.call()
+        return FakeSpreadsheet(self.backend)
+
+    def open_by_key(self, key):
+        self.backend.call()
+        return FakeSpreadsheet(self.backend)
+
+    def get_file_drive_metadata(self, id):
+        self.backend.call()
+        return {'id': id, 'modifiedTime': self.backend.modified}
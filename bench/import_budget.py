@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+# Import time and memory of `import helpers` in a fresh interpreter, checked against a budget.
+# Run from the repository root, with .streamlit/secrets.toml in place:
+#
+#   python bench/import_budget.py                    measure, and fail if over bench/import_budget.json
+#   python bench/import_budget.py --save-budget      store the measurements times headroom as the budget
+#
+# The budget also lists modules that must not be loaded by the import. Budgets are only
+# comparable on the machine they were recorded on
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+budget_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'import_budget.json')
+
+# Modules helpers imports at first use
+lazy_modules = ['gspread', 'google.oauth2.service_account', 'google.generativeai', 'streamlit_card']
+
+# Measures one import in the child interpreter and prints it as JSON
+child = '''
+import json, sys, time
+
+def rss():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+
+before = rss()
+started = time.perf_counter()
+import helpers
+seconds = time.perf_counter() - started
+print(json.dumps({'seconds': seconds, 'rss_mib': rss() - before,
+                  'loaded': [name for name in %r if name in sys.modules]}))
+'''
+
+
+# Median import time and memory over repeat fresh interpreters, and the lazy modules any of them loaded
+def measure(repeat):
+    runs = []
+    for run in range(repeat):
+        output = subprocess.run([sys.executable, '-c', child % lazy_modules], cwd=root,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {'seconds': round(float(np.median([run['seconds'] for run in runs])), 3),
+            'rss_mib': round(float(np.median([run['rss_mib'] for run in runs])), 1),
+            'loaded': sorted({name for run in runs for name in run['loaded']})}
+
+
+# Measurements over their budget, as (what, budget, measured)
+def over_budget(measured, budget):
+    over = []
+    for name in ['seconds', 'rss_mib']:
+        if name in budget and measured[name] > budget[name]:
+            over.append((name, budget[name], measured[name]))
+    for name in measured['loaded']:
+        if name in budget.get('lazy_modules', []):
+            over.append((f'import of {name}', 'lazy', 'loaded'))
+    return over
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the import time and memory of helpers against a budget')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget', default=budget_path, help='Budget JSON file')
+    parser.add_argument('--save-budget', action='store_true', help='Write the measurements times headroom as the budget')
+    parser.add_argument('--headroom', type=float, default=1.5)
+    args = parser.parse_args()
+
+    measured = measure(args.repeat)
+    print(f'import helpers  {measured["seconds"] * 1000:.0f} ms  {measured["rss_mib"]} MiB  '
+          f'lazy modules loaded: {", ".join(measured["loaded"]) or "none"}')
+    if args.save_budget:
+        budget = {'seconds': round(measured['seconds'] * args.headroom, 3),
+                  'rss_mib': round(measured['rss_mib'] * args.headroom, 1), 'lazy_modules': lazy_modules}
+        with open(args.budget, 'w') as f:
+            json.dump(budget, f, indent=1)
+        print(f'Saved budget {budget}')
+        sys.exit(0)
+    with open(args.budget) as f:
+        budget = json.load(f)
+    over = over_budget(measured, budget)
+    for name, limit, value in over:
+        print(f'OVER BUDGET {name}: {value} > {limit}')
+    if over:
+        sys.exit(1)
+    print('Within budget')
@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+# The Gemini key pool against a fake model endpoint: concurrent requests through KeyPool.call,
+# then a precompute_feedback run and its resume. Minutes are shortened to --per seconds.
+# Run from the repository root, with .streamlit/secrets.toml in place:
+#
+#   python bench/key_pool.py                                 pool and precompute, with default load
+#   python bench/key_pool.py --threads 32 --quota-rate 0.1   more callers, more random 429 errors
+#
+# The model allows a key one request more than the pool does, so that requests still in
+# flight when the pool refills a key are not refused. Fails if the pool sent a key over the
+# model's rate, or if the resumed precompute asked again prompts the first run answered
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_gemini
+from keypool import KeyPool, KeyPoolBusy
+from precompute import precompute_feedback
+from helpers import logger, prompt_key
+from responses import ResponseCache
+
+keys = ['API_key_1', 'API_key_2', 'API_key_3', 'API_key_4']
+
+
+def key_pool(args):
+    return KeyPool(keys, rate=args.rate, per=args.per, max_waiting=args.max_waiting, max_wait=args.max_wait,
+                   cooldown=args.per / 2, max_cooldown=args.per * 4)
+
+
+# threads callers sending requests each through one pool. Returns latencies of answered
+# calls, and the numbers of calls refused by the pool and by the model
+def drive_pool(pool, model, threads, requests):
+    latencies = []
+    refused = {'busy': 0, 'quota': 0}
+    lock = threading.Lock()
+
+    def caller(number):
+        for request in range(requests):
+            started = time.perf_counter()
+            try:
+                pool.call(lambda name: model.generate(name, f'prompt {number}.{request}'))
+            except KeyPoolBusy:
+                with lock:
+                    refused['busy'] += 1
+                continue
+            except fake_gemini.ResourceExhausted:
+                with lock:
+                    refused['quota'] += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    callers = [threading.Thread(target=caller, args=(number,)) for number in range(threads)]
+    for thread in callers:
+        thread.start()
+    for thread in callers:
+        thread.join()
+    return latencies, refused
+
+
+def bench_pool(args):
+    model = fake_gemini.FakeModel(args.latency, args.quota_rate, args.rate + 1, args.per)
+    pool = key_pool(args)
+    started = time.perf_counter()
+    latencies, refused = drive_pool(pool, model, args.threads, args.requests)
+    elapsed = time.perf_counter() - started
+    samples = np.array(latencies or [0]) * 1000
+    stats = pool.stats()
+    result = {'seconds': round(elapsed, 2), 'answered': len(latencies),
+              'per_second': round(len(latencies) / elapsed, 1), 'limit_per_second': round(len(keys) * args.rate / args.per, 1),
+              'p50_ms': round(float(np.percentile(samples, 50)), 1), 'p99_ms': round(float(np.percentile(samples, 99)), 1),
+              'busy': refused['busy'], 'quota_errors': refused['quota'], 'over_rate': model.over_rate,
+              'waited': stats['waited'], 'average_wait_seconds': stats['average_wait_seconds'],
+              'calls_by_key': model.calls_by_key}
+    print(f'KeyPool.call  {result["answered"]} answered in {result["seconds"]} s  '
+          f'{result["per_second"]}/s, keys refill {result["limit_per_second"]}/s  p50 {result["p50_ms"]} ms  '
+          f'p99 {result["p99_ms"]} ms  busy {result["busy"]}  429 {result["quota_errors"]} '
+          f'(over rate {result["over_rate"]})  waited {result["waited"]}', flush=True)
+    return result
+
+
+# Precompute feedback for synthetic prompts, then run it again on the same checkpoint
+def bench_precompute(args):
+    model = fake_gemini.FakeModel(args.latency, args.quota_rate, args.rate + 1, args.per)
+    directory = tempfile.mkdtemp(prefix='bench-precompute-')
+    cache = ResponseCache(directory=os.path.join(directory, 'cache'))
+    checkpoint = os.path.join(directory, 'checkpoint.jsonl')
+    prompts = []
+    for roll_number in range(1, args.students + 1):
+        for limit in ['short', 'medium', 'long']:
+            prompt = f'Feedback of roll {roll_number} in {limit} words'
+            prompts.append((roll_number, limit, prompt_key('gemini-pro', prompt), prompt))
+
+    runs = []
+    for run in ['first', 'resumed']:
+        calls = model.calls
+        started = time.perf_counter()
+        answered, failed = precompute_feedback(prompts, key_pool(args), cache, checkpoint,
+                                               generate=model.generate, workers=args.workers)
+        runs.append({'run': run, 'seconds': round(time.perf_counter() - started, 2), 'answered': answered,
+                     'failed': failed, 'model_calls': model.calls - calls})
+        print(f'precompute_feedback {run:<8} {answered} answered, {failed} failed of {len(prompts)} '
+              f'in {runs[-1]["seconds"]} s  model calls {runs[-1]["model_calls"]}', flush=True)
+    return {'prompts': len(prompts), 'over_rate': model.over_rate, 'runs': runs}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Drive the Gemini key pool against a fake model endpoint')
+    parser.add_argument('--rate', type=int, default=10, help='Requests per key per --per seconds of the pool')
+    parser.add_argument('--per', type=float, default=2.0, help='Seconds standing in for a minute')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds per fake model call')
+    parser.add_argument('--quota-rate', type=float, default=0.02, help='Share of fake model calls failing with 429')
+    parser.add_argument('--threads', type=int, default=16, help='Concurrent callers of KeyPool.call')
+    parser.add_argument('--requests', type=int, default=10, help='Requests per caller')
+    parser.add_argument('--max-waiting', type=int, default=16)
+    parser.add_argument('--max-wait', type=float, default=5.0)
+    parser.add_argument('--students', type=int, default=30, help='Students of the precompute run, three prompts each')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--out', help='Write the results to this JSON file')
+    args = parser.parse_args()
+
+    logger.setLevel('ERROR')
+    results = {'pool': bench_pool(args), 'precompute': bench_precompute(args)}
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=1)
+    problems = []
+    if results['pool']['over_rate'] or results['precompute']['over_rate']:
+        problems.append('the pool sent a key over its rate')
+    first, resumed = results['precompute']['runs']
+    if resumed['answered'] + resumed['failed'] != first['failed']:
+        problems.append('the resumed precompute asked answered prompts again')
+    for problem in problems:
+        print(f'FAILED {problem}')
+    if problems:
+        sys.exit(1)
+    print('Pool kept every key within its rate')
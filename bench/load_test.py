@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest.mock import MagicMock
+
+import numpy as np
+
+# Load test of srv.py: N simulated sessions run the real script concurrently against a fake
+# spreadsheet. Each session passes the passphrase gate, triggers or joins the initial fetch,
+# then enters a stream of roll numbers, with an empty entry now and then for the leaderboards.
+# Tabs are drawn on every rerun, so each rerun renders every tab of the page.
+# Run from the repository root, with .streamlit/secrets.toml in place:
+#
+#   python bench/load_test.py --sessions 1,10,50,100,500 --steps 5
+#
+# Each level runs in a fresh process, so that it starts cold and its RSS is its own
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+# Current and peak resident set size of this process, in MiB
+def rss():
+    current = None
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    current = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return current, round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+# Run one level of the load test in this process and return its results
+def run_level(sessions, steps, ramp, latency, columns, seed):
+    import streamlit as st
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1 import AppTest
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+    import fake_gspread
+    import helpers
+
+    # AppTest installs a mock runtime for each run and removes it afterwards, so runs of
+    # different sessions cannot overlap. Sessions here share one runtime, like in a server
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage('/mock/media'))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime._instance = runtime
+
+    class SessionTest(AppTest):
+        def _run(self, widget_state=None, timeout=None):
+            script_runner = LocalScriptRunner(self._script_path, self.session_state)
+            self._tree = script_runner.run(widget_state, self.query_params, timeout or self.default_timeout)
+            self._tree._runner = self
+            return self
+
+    backend = fake_gspread.Backend(fake_gspread.workbook(columns=columns), latency)
+    helpers.authorize_client = lambda account: fake_gspread.FakeClient(backend)
+    helpers.snapshot_dir = tempfile.mkdtemp(prefix='load-test-snapshots-')
+    helpers.logger.setLevel('WARNING')
+    password = st.secrets['password']
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def session(number):
+        rolls = random.Random(seed + number)
+        time.sleep(ramp * number / max(1, sessions))
+        at = SessionTest(os.path.join(root, 'srv.py'), default_timeout=600)
+        timings = []
+        try:
+            started = time.perf_counter()
+            at.run()
+            at.text_input[0].input(password).run()
+            # The passphrase rerun triggers st.rerun, which draws the page
+            at.run()
+            timings.append(('fetch', time.perf_counter() - started))
+            for step in range(steps):
+                roll = '' if rolls.random() < 0.2 else str(rolls.randint(1, 250))
+                started = time.perf_counter()
+                at.text_input[0].input(roll).run()
+                timings.append(('leaderboard' if roll == '' else 'student', time.perf_counter() - started))
+                if at.exception:
+                    raise RuntimeError(at.exception[0].value)
+        except Exception as error:
+            with lock:
+                errors.append(repr(error))
+        with lock:
+            latencies.extend(timings)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(number,)) for number in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    def distribution(kind=None):
+        samples = np.array([seconds for name, seconds in latencies if kind is None or name == kind]) * 1000
+        if not len(samples):
+            return None
+        return {'reruns': len(samples), 'p50_ms': round(float(np.percentile(samples, 50)), 1),
+                'p90_ms': round(float(np.percentile(samples, 90)), 1),
+                'p99_ms': round(float(np.percentile(samples, 99)), 1), 'max_ms': round(float(samples.max()), 1)}
+
+    current, peak = rss()
+    return {'sessions': sessions, 'steps': steps, 'seconds': round(elapsed, 1),
+            'fetch': distribution('fetch'), 'student': distribution('student'),
+            'leaderboard': distribution('leaderboard'), 'all': distribution(),
+            'backend_calls': backend.calls, 'backend_calls_per_session': round(backend.calls / sessions, 2),
+            'rss_mib': current, 'peak_rss_mib': peak, 'errors': len(errors), 'first_errors': errors[:3]}
+
+
+def print_level(result):
+    every = result['all'] or {}
+    print(f'{result["sessions"]:>5} sessions  {result["seconds"]:>8.1f} s  '
+          f'rerun p50 {every.get("p50_ms", 0):>9.1f} ms  p90 {every.get("p90_ms", 0):>9.1f} ms  '
+          f'p99 {every.get("p99_ms", 0):>9.1f} ms  calls/session {result["backend_calls_per_session"]:>6}  '
+          f'RSS {result["rss_mib"]} MiB (peak {result["peak_rss_mib"]})  errors {result["errors"]}', flush=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test srv.py with concurrent AppTest sessions')
+    parser.add_argument('--sessions', default='1,10,50', help='Comma separated numbers of concurrent sessions')
+    parser.add_argument('--steps', type=int, default=5, help='Roll number entries per session')
+    parser.add_argument('--ramp', type=float, default=1.0, help='Seconds over which sessions arrive')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds per fake API call')
+    parser.add_argument('--columns', type=int, default=120, help='Date columns of the fake spreadsheet, at most 200')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help='Write the results to this JSON file')
+    parser.add_argument('--level', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.level is not None:
+        result = run_level(args.level, args.steps, args.ramp, args.latency, args.columns, args.seed)
+        print('RESULT ' + json.dumps(result))
+        sys.exit(0)
+
+    results = []
+    for sessions in [int(number) for number in args.sessions.split(',')]:
+        command = [sys.executable, os.path.abspath(__file__), '--level', str(sessions), '--steps', str(args.steps),
+                   '--ramp', str(args.ramp), '--latency', str(args.latency), '--columns', str(args.columns),
+                   '--seed', str(args.seed)]
+        output = subprocess.run(command, cwd=root, capture_output=True, text=True).stdout
+        lines = [line for line in output.splitlines() if line.startswith('RESULT ')]
+        if not lines:
+            print(f'{sessions:>5} sessions  failed to run')
+            continue
+        results.append(json.loads(lines[-1][len('RESULT '):]))
+        print_level(results[-1])
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=1)
@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+# Offline benchmarks of the data path and the renderers against a fake spreadsheet.
+# Run from the repository root, with .streamlit/secrets.toml in place:
+#
+#   python bench/run.py                              time everything, print a table
+#   python bench/run.py --save-baseline              also store the results as the baseline
+#   python bench/run.py --baseline bench/baseline.json
+#                                                    fail if a median got slower than tolerance × baseline
+#
+# Baselines are only comparable on the machine they were recorded on
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import streamlit as st
+import fake_gspread
+import helpers
+from assets import AssetRegistry
+from attendance import AttendanceMatrix, summarize_grid
+from eligibility import eligibility_table
+from ranking import student_ranking
+from scheduler import ReaderScheduler
+from snapshot import SnapshotStore
+from views import ViewCache
+
+
+# Session state outside of a Streamlit server, readable by key and by attribute
+class Session(dict):
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+# Singletons are only cached inside a Streamlit server. Pin them for the benchmarks
+def pin(name, value):
+    setattr(helpers, name, lambda: value)
+    return value
+
+
+def percentiles(samples):
+    samples = np.array(samples) * 1000
+    return {'runs': len(samples), 'p50_ms': round(float(np.percentile(samples, 50)), 3),
+            'p90_ms': round(float(np.percentile(samples, 90)), 3),
+            'p99_ms': round(float(np.percentile(samples, 99)), 3),
+            'mean_ms': round(float(samples.mean()), 3), 'min_ms': round(float(samples.min()), 3)}
+
+
+# Time fn repeat times, after setup each time, then run it once more under tracemalloc for its peak memory
+def measure(fn, repeat, setup=None):
+    samples = []
+    for run in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    if setup:
+        setup()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {**percentiles(samples), 'peak_kib': round(peak / 1024)}
+
+
+# Fresh shared state, as in a server process that has just started
+def cold_start(client):
+    helpers.authorize_client = lambda account: client
+    pin('reader_scheduler', ReaderScheduler(helpers.reader_accounts))
+    pin('snapshot_store', SnapshotStore(ttl=3900, prepare=helpers.build_model))
+    pin('student_views', ViewCache())
+    st.session_state = Session(snapshot_version=0, eligible=True, access=True)
+
+
+def bench_load(args, results):
+    for latency, quota_rate in [(0.0, 0.0), (args.latency, 0.0), (args.latency, args.quota_rate)]:
+        backend = fake_gspread.Backend(fake_gspread.workbook(columns=min(args.app_columns, 200)), latency, quota_rate)
+        client = fake_gspread.FakeClient(backend)
+        calls = []
+
+        def setup():
+            cold_start(client)
+            calls.append(backend.calls)
+
+        name = f'load_student_data[latency={latency},quota_rate={quota_rate}]'
+        results[name] = measure(helpers.load_student_data, args.repeat, setup)
+        calls.append(backend.calls)
+        results[name]['backend_calls'] = round((calls[-1] - calls[0]) / (len(calls) - 1), 1)
+        print_row(name, results[name])
+
+
+def bench_engines(args, results):
+    for students in args.students:
+        scores = fake_gspread.scores_frame(students)
+        for columns in args.columns:
+            size = f'{students}x{columns}'
+            frame = fake_gspread.attendance_frame(students, columns)
+            rows = [list(frame.columns)] + frame.values.tolist()
+            benches = {
+                f'df_with_header[{size}]': lambda: helpers.df_with_header(rows),
+                f'AttendanceMatrix.from_grid[{size}]': lambda: AttendanceMatrix.from_grid(frame),
+            }
+            matrix = AttendanceMatrix.from_grid(frame)
+            benches[f'summarize_grid[{size}]'] = lambda: summarize_grid(matrix, weight=2, bonus_suffix='ECE')
+            summary = summarize_grid(matrix)
+            attendance = {'Theory': summary, 'Practical': summary, 'AETCOM': summary}
+            benches[f'eligibility_table[{size}]'] = lambda: eligibility_table(
+                attendance, scores, helpers.cutoff, helpers.score_cutoff, students)
+            benches[f'student_ranking[{size}]'] = lambda: student_ranking(attendance, scores, students)
+            for name, fn in benches.items():
+                results[name] = measure(fn, args.repeat)
+                print_row(name, results[name])
+
+
+def bench_renders(args, results):
+    backend = fake_gspread.Backend(fake_gspread.workbook(columns=min(args.app_columns, 200)))
+    cold_start(fake_gspread.FakeClient(backend))
+    helpers.load_student_data()
+    pin('asset_registry', AssetRegistry(helpers.asset_dir))
+    rolls = random.Random(1)
+    roll = {'number': 1}
+
+    def next_roll():
+        roll['number'] = rolls.randint(1, 250)
+
+    def build_view():
+        helpers.build_student_view(st.session_state, roll['number'])
+
+    benches = {
+        'build_student_view': build_view,
+        'render_profile': lambda: helpers.render_profile(roll['number']),
+        'render_house_leaderboard': lambda: helpers.render_house_leaderboard(roll['number']),
+        'render_theory': lambda: helpers.render_theory(roll['number']),
+        'render_attendance': lambda: helpers.render_attendance(roll['number']),
+        'render_scores': lambda: helpers.render_scores(roll['number']),
+        'render_leaderboard': helpers.render_leaderboard,
+    }
+    for name, fn in benches.items():
+        results[name] = measure(fn, args.repeat, next_roll)
+        print_row(name, results[name])
+
+
+def print_row(name, stats):
+    print(f'{name:<58} p50 {stats["p50_ms"]:>10.3f} ms  p90 {stats["p90_ms"]:>10.3f} ms  '
+          f'p99 {stats["p99_ms"]:>10.3f} ms  peak {stats["peak_kib"]:>8} KiB', flush=True)
+
+
+# Benchmarks whose median got slower than tolerance times the baseline's
+def regressions(results, baseline, tolerance):
+    slower = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if base and base['p50_ms'] > 0 and stats['p50_ms'] > base['p50_ms'] * tolerance:
+            slower.append((name, base['p50_ms'], stats['p50_ms']))
+    return slower
+
+
+def parse_sizes(text):
+    return [int(size) for size in text.split(',')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the app against a fake spreadsheet')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--students', type=parse_sizes, default=[250, 1000, 5000], help='Cohort sizes of the engine benchmarks')
+    parser.add_argument('--columns', type=parse_sizes, default=[50, 200, 400], help='Date columns of the engine benchmarks')
+    parser.add_argument('--app-columns', type=int, default=120, help='Date columns of the fake spreadsheet, at most 200')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds per fake API call')
+    parser.add_argument('--quota-rate', type=float, default=0.1, help='Share of fake API calls failing with 429')
+    parser.add_argument('--only', choices=['load', 'engines', 'renders'], action='append')
+    parser.add_argument('--out', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Compare with the results in this JSON file')
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results to bench/baseline.json')
+    parser.add_argument('--tolerance', type=float, default=1.5)
+    args = parser.parse_args()
+
+    helpers.logger.setLevel('WARNING')
+    helpers.snapshot_dir = tempfile.mkdtemp(prefix='bench-snapshots-')
+    results = {}
+    for suite, bench in [('load', bench_load), ('engines', bench_engines), ('renders', bench_renders)]:
+        if not args.only or suite in args.only:
+            bench(args, results)
+
+    report = {'environment': {'python': platform.python_version(), 'pandas': pd.__version__,
+                              'numpy': np.__version__, 'machine': platform.machine()},
+              'benchmarks': results}
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=1)
+    if args.save_baseline:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json'), 'w') as f:
+            json.dump(report, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['benchmarks']
+        slower = regressions(results, baseline, args.tolerance)
+        for name, before, after in slower:
+            print(f'REGRESSION {name}: p50 {before:.3f} ms -> {after:.3f} ms')
+        if slower:
+            sys.exit(1)
+        print(f'No regressions over {args.tolerance}x the baseline')
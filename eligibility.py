@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+
+# Eligibility of every student on every criterion, one row per roll number.
+# For each criterion the table holds the student's value, whether it meets the cutoff
+# and its margin over the cutoff. Attendance criteria come from the attendance summaries
+# and score criteria from the numeric scores. A missing value is not held against the
+# student. Eligible is True only when every criterion is met
+def eligibility_table(attendance, scores, attendance_cutoff, score_cutoff, students=250):
+    rolls = pd.RangeIndex(1, students + 1, name='Roll No')
+    values = {}
+    for criterion in attendance_cutoff:
+        values[criterion] = attendance[criterion]['percentage'].reindex(rolls).astype(float)
+    for criterion in score_cutoff:
+        values[criterion] = pd.Series(scores[criterion].iloc[:students].to_numpy(dtype=float), index=rolls)
+
+    table = pd.DataFrame(index=rolls)
+    cutoffs = {**attendance_cutoff, **score_cutoff}
+    for criterion, value in values.items():
+        table[criterion] = value
+        table[f'{criterion} eligible'] = ~(value < cutoffs[criterion]).to_numpy()
+        table[f'{criterion} margin'] = value - cutoffs[criterion]
+    flags = table[[f'{criterion} eligible' for criterion in cutoffs]].to_numpy()
+    table['Eligible'] = np.logical_and.reduce(flags, axis=1)
+    return table
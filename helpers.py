@@ -1,26 +1,81 @@
 import streamlit as st
-import gspread
+from streamlit.logger import get_logger
 import pandas as pd
-from google.oauth2 import service_account
-import random
+import os
 import re
-import google.generativeai as genai
-from streamlit_card import card
-import base64
+import json
+import threading
+import time
+from functools import wraps
+from collections import deque
+from statistics import median
+from datetime import date, datetime
+import io
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from snapshot import SnapshotStore, save_snapshot, load_snapshot
+from scheduler import ReaderScheduler, is_quota_error
+from attendance import AttendanceMatrix, summarize_grid, summarize_batches
+from eligibility import eligibility_table
+from ranking import student_ranking, house_leaderboards, house_points
+from views import StudentView, ViewCache
+from assets import AssetRegistry
+from responses import ResponseCache, prompt_key
+from keypool import KeyPool, KeyPoolBusy
+from metrics import MetricsRegistry, size_buckets
+from profiling import start_profile, profile_name, save_profile
+
+# gspread, google.oauth2, google.generativeai and streamlit_card are imported at first use,
+# so that the server starts without loading the Google API clients. Records are fetched
+# on a background thread, and most sessions never ask the AI
 
 sheet_name = st.secrets['sheet_name']
 
+# Directory of the snapshot saved for the next server start
+snapshot_dir = st.secrets.get('snapshot_dir', 'snapshots')
+
+# Directory of the rerun profiles, kept when reruns are profiled
+profile_dir = st.secrets.get('profile_dir', 'profiles')
+
+# Directory of the images, served as static files when server.enableStaticServing is set
+asset_dir = 'static'
+
+logger = get_logger(__name__)
+
 # Names must match worksheet names
 batch_sessions = ["Practical", "AETCOM"]
 cutoff = {"Theory": 75 ,"Practical": 80, "AETCOM": 75}
 
+# Minimum scores
+score_cutoff = {"Theory Total": 40, "Practical Total": 40, "Aggregate": 50}
+
 # Frames must match possible batch ranges
 dataframes = ["D2:GU52", "D55:GU105", "D108:GU158", "D161:GU211", "D214:GU264"]
 name_frame = "B1:L251"
-house_frames = ["A1:F6", "A11:M261", "A266:H316", "J266:Q316", "S266:Z316", "AB266:AI316", "AK266:AR316"]
+# Only the house points table is downloaded. Leaderboards are ranked from the records
+house_frames = ["A1:F6"]
 theory_frame = "D1:GU251"
 scores_frames = ["B2:AC253", "B255"]
 house_point_frame = "A9:D250"
+
+# Grids that grow by one date column per class, and can be synced incrementally
+attendance_records = ['theory'] + batch_sessions
+
+# Reader accounts - make sure read access is granted
+reader_accounts = ['Reader_1', 'Reader_2', 'Reader_3', 'Reader_4', 
+                   'Reader_5', 'Reader_6', 'Reader_7', 'Reader_8', 'Reader_9', 
+                   'Reader_10', 'Reader_11', 'Reader_12', 'Reader_13', 'Reader_14', 
+                   'Reader_15', 'Reader_16', 'Reader_17', 'Reader_18', 'Reader_19']
+
+# Worksheet and ranges of each record. Keys are the session state variables
+record_ranges = {
+    'houses': ('Houses', house_frames),
+    'names': ('Eligibility', [name_frame]),
+    'theory': ('Theory', [theory_frame]),
+    'Practical': ('Practical', dataframes),
+    'AETCOM': ('AETCOM', dataframes),
+    'scores': ('Scores', scores_frames),
+    'house_point_history': ('House Point History', [house_point_frame]),
+}
 scores_columns = ['Aggregate','Theory Total','Theory IA','Theory FA','Theory 1','Theory 2','Theory 3',
                   'Viva 1','Viva 2','MCQ 1','MCQ 2','MCQ 3','Seminar','Th Professionalism',
                   'Practical Total','Practical IA','Practical FA','Practical 1','Practical 2','Practical 3',
@@ -53,18 +108,39 @@ scientists = {
 # AI response word limit
 word_limits = {'long': '300 to 400', 'medium': '200 to 300', 'short': '100 to 200' }
 
+# Names of the Gemini API key secrets
+gemini_keys = ['API_key_1', 'API_key_2', 'API_key_3', 'API_key_4']
+
 medals = {'1': '🏅🥇🥇🥇🏅', '2': '🏅🥈🥈🏅', '3': '🏅🥉🏅', '4': '🏅🏅', '5': '🏅'}
 
+
+# Build the result of fn once per arguments for the whole process. Unlike st.cache_resource,
+# which only caches on script threads, this also shares it with background and worker threads
+def process_resource(fn):
+    built = {}
+    lock = threading.Lock()
+
+    @wraps(fn)
+    def get(*args):
+        with lock:
+            if args not in built:
+                built[args] = fn(*args)
+            return built[args]
+    return get
+
+
 # Cache google sheet credentials
-@st.cache_resource
+@process_resource
 def load_google_sheets_credentials(account):
     google_sheets_credentials = st.secrets[account]
     return google_sheets_credentials
 
 
 # Cache gspread
-@st.cache_resource
+@process_resource
 def authorize_client(account):
+    import gspread
+    from google.oauth2 import service_account
     google_sheets_credentials = load_google_sheets_credentials(account)
     scopes = [
         'https://spreadsheets.google.com/feeds',
@@ -80,115 +156,697 @@ def authorize_client(account):
 
 # Convert dataframes to pandas dataframes with first row as column names
 def df_with_header(data):
-    df = pd.DataFrame(data=data[1:], columns=data[0])
+    registry = metrics()
+    with registry.time('stage_seconds', stage='parse'):
+        df = pd.DataFrame(data=data[1:], columns=data[0])
+    registry.observe('parse_cells', df.size)
     return df
 
 
-# Load student data into session state variables. Log operations into status
-def load_student_data():
-    # Reader accounts - make sure read access is granted
-    accounts = ['Reader_1', 'Reader_2', 'Reader_3', 'Reader_4', 
-                'Reader_5', 'Reader_6', 'Reader_7', 'Reader_8', 'Reader_9', 
-                'Reader_10', 'Reader_11', 'Reader_12', 'Reader_13', 'Reader_14', 
-                'Reader_15', 'Reader_16', 'Reader_17', 'Reader_18', 'Reader_19']
-    number_of_accounts = len(accounts)
-    shuffles = random.randint(2, 10)
-    for i in range(shuffles):
-        random.shuffle(accounts)
+# Convert the given columns of a copy of a dataframe to numbers
+def with_numeric(frame, columns):
+    frame = frame.copy()
+    for column in columns:
+        frame[column] = pd.to_numeric(frame[column], errors='coerce')
+    return frame
+
+
+# Typed records for the renderers, built once per snapshot from the raw worksheet records.
+# Scores and bonuses become numbers, attendance grids become packed attendance matrices
+# and leaderboards are ranked from attendance and scores. Renderers only read these and
+# never modify them
+def build_model(records):
+    model = dict(records)
+
+    model['house_point_history'] = with_numeric(records['house_point_history'], ['Roll No', 'Bonus'])
+
+    # Scores are shown as 'score / maximum'. The last row holds the maximum scores
+    scores = records['scores']
+    model['scores'] = with_numeric(scores, scores_columns)
+    maximum = scores.loc[250, scores_columns].astype(str)
+    model['score_labels'] = scores[scores_columns].iloc[:250].astype(str) + ' / ' + maximum
+    # Assessments not conducted yet are zero for every student
+    zeroes = (model['scores'][scores_columns] == 0).sum()
+    model['pending_assessments'] = frozenset(zeroes.index[zeroes == 250])
+
+    model['theory'] = AttendanceMatrix.from_grid(records['theory'])
+    for batch in batch_sessions:
+        model[batch] = [AttendanceMatrix.from_grid(frame) for frame in records[batch]]
+
+    # Attendance summaries of every student, looked up by roll number
+    model['attendance'] = {
+        'Theory': summarize_grid(model['theory'], students=250),
+        'Practical': summarize_batches(model['Practical'], weight=2, bonus_suffix='ECE'),
+        'AETCOM': summarize_batches(model['AETCOM']),
+    }
+    model['eligibility'] = eligibility_table(model['attendance'], model['scores'], cutoff, score_cutoff)
+
+    # Houses are the points table, the global leaderboard and the five house leaderboards
+    ranking = student_ranking(model['attendance'], model['scores'])
+    maximum_score = model['scores'].loc[250, 'Theory Total'] + model['scores'].loc[250, 'Practical Total']
+    points = house_points(records['houses'][0], ranking, houses_list, maximum_score)
+    model['houses'] = [points, ranking] + house_leaderboards(ranking, len(houses_list))
+    model['house_ranking'] = points.sort_values(by='Rank').reset_index(drop=True)
+    return model
+
+
+# Share reader account usage and health between all sessions and threads of the server process
+@process_resource
+def reader_scheduler():
+    return ReaderScheduler(reader_accounts, limit=st.secrets.get('reader_requests_per_minute', 60))
+
+
+# Share one snapshot of student records between all sessions of the server process.
+# It starts from the snapshot saved on disk by the previous process, if any
+@st.cache_resource(show_spinner=False)
+def snapshot_store():
+    store = SnapshotStore(ttl=st.secrets.get('snapshot_ttl', 3900), prepare=build_model)
+    snapshot = load_snapshot(snapshot_dir)
+    if snapshot is not None:
+        store.restore(snapshot)
+    return store
+
+
+# Read and encode the images once for all sessions of the server process
+@st.cache_resource(show_spinner=False)
+def asset_registry():
+    return AssetRegistry(asset_dir, static=st.get_option('server.enableStaticServing'),
+                         base_url=st.get_option('server.baseUrlPath'))
+
+
+# Share AI feedback between all sessions of the server process. Responses are kept
+# on disk too if ai_cache_dir is set
+@st.cache_resource(show_spinner=False)
+def response_cache():
+    return ResponseCache(ttl=st.secrets.get('ai_cache_ttl', 86400), size=st.secrets.get('ai_cache_size', 1024),
+                         directory=st.secrets.get('ai_cache_dir'))
+
+
+# Share the Gemini API keys and their rate limits between all sessions of the server process
+@st.cache_resource(show_spinner=False)
+def gemini_key_pool():
+    return KeyPool(gemini_keys, rate=st.secrets.get('gemini_requests_per_minute', 60),
+                   max_waiting=st.secrets.get('gemini_max_waiting', 16), max_wait=st.secrets.get('gemini_max_wait', 10))
+
+
+# Time to first token and total time of the latest streamed AI responses, in seconds
+@st.cache_resource(show_spinner=False)
+def ai_latencies():
+    return deque(maxlen=st.secrets.get('ai_latency_samples', 256))
+
+
+# Share built student views between all sessions of the server process
+@st.cache_resource(show_spinner=False)
+def student_views():
+    return ViewCache(st.secrets.get('student_view_cache_size', 512))
+
+
+# Timings and sizes of the data load and render stages of all sessions and threads of the server process
+@process_resource
+def metrics():
+    registry = MetricsRegistry(prefix='mirrors_')
+    registry.describe('stage_seconds', 'Seconds spent in each stage of loading the student records')
+    registry.describe('download_cells', 'Cells downloaded by each batch-get', size_buckets)
+    registry.describe('download_bytes', 'Bytes of the values downloaded by each batch-get, as JSON', size_buckets)
+    registry.describe('parse_cells', 'Cells of each downloaded grid parsed into a dataframe', size_buckets)
+    registry.describe('render_seconds', 'Seconds spent in each renderer')
+    return registry
+
+
+# Log a summary of the metrics every metrics_log_interval seconds, once per server process
+@st.cache_resource(show_spinner=False)
+def start_metrics_log():
+    stop = threading.Event()
+    interval = st.secrets.get('metrics_log_interval', 600)
+
+    def log():
+        while not stop.wait(interval):
+            summary = metrics().summary()
+            if summary:
+                logger.info(f'Metrics: {summary}')
+
+    if interval:
+        threading.Thread(target=log, name='metrics-log', daemon=True).start()
+    return stop
+
+
+# Record the seconds spent in each call of a renderer
+def timed(renderer):
+    @wraps(renderer)
+    def render(*args, **kwargs):
+        with metrics().time('render_seconds', renderer=renderer.__name__):
+            return renderer(*args, **kwargs)
+    return render
+
+
+# Reruns are profiled for every session if the MIRRORS_PROFILE environment variable is set,
+# and for sessions opened with ?profile=<admin_key>
+def profiling_requested():
+    if os.environ.get('MIRRORS_PROFILE'):
+        return True
+    return 'admin_key' in st.secrets and st.query_params.get('profile') == st.secrets['admin_key']
+
+
+# Profile the rerun if asked to. The profile of a previous rerun that stopped early,
+# e.g. on st.rerun, is dropped
+def start_rerun_profile():
+    profile = st.session_state.pop('rerun_profile', None)
+    if profile is not None:
+        profile.disable()
+    if profiling_requested():
+        st.session_state.rerun_profile = start_profile()
+
+
+# Save the profile of the rerun, named after its snapshot version, roll number and page.
+# Every tab of a page is drawn on each rerun, so the profile covers all of its tabs.
+# Reruns stopped before the student pages give the page they stopped on
+def finish_rerun_profile(roll_number, page=None):
+    profile = st.session_state.pop('rerun_profile', None)
+    if profile is None:
+        return
+    if page is not None:
+        name = profile_name(st.session_state.snapshot_version, 'none', page)
+    elif st.session_state.valid_roll_number:
+        name = profile_name(st.session_state.snapshot_version, roll_number, 'student')
+    else:
+        name = profile_name(st.session_state.snapshot_version, 'none', 'leaderboard')
+    try:
+        path = save_profile(profile, profile_dir, name, st.secrets.get('profile_keep', 20))
+        logger.info(f'Saved rerun profile {path}')
+    except OSError:
+        logger.exception('Could not save rerun profile')
+
+
+# End the rerun with st.stop, saving its profile first, so that the profiler does
+# not stay enabled on the thread
+def stop_rerun(page):
+    finish_rerun_profile(None, page)
+    st.stop()
+
+
+# Tables of the theory and practical assessments named in the scores update news.
+# Either is None if the news does not name them or names an unknown assessment
+def news_score_tables(news, labels):
+    matches = re.findall(r'\(([^)]+)\)', news)
+    if len(matches) < 2:
+        return None, None
+    tables = []
+    for heading, match in zip(['Theory', 'Practical'], matches):
+        assessments = match.split(', ')
+        try:
+            tables.append(pd.DataFrame({heading: assessments, 'Score': [labels[assessment] for assessment in assessments]}))
+        except KeyError:
+            tables.append(None)
+    return tuple(tables)
+
+
+# Everything the student pages show for a roll number, built from a snapshot model
+def build_student_view(model, roll_number):
+    names = model['names']
+    house_index = ((roll_number - 1) % 50) // 10
+    history = model['house_point_history']
+    labels = model['score_labels'].iloc[roll_number-1].to_dict()
+    # Assessments not conducted yet are shown as TBD
+    scores = dict(labels)
+    for column in theory_scores + practical_scores:
+        if column in model['pending_assessments']:
+            scores[column] = 'TBD'
+    return StudentView(
+        roll_number=roll_number,
+        name=names['Name'][roll_number-1],
+        reg_no=names['Reg No'][roll_number-1],
+        access=names['Access'][roll_number-1] == "YES",
+        house=houses_list[house_index],
+        house_index=house_index,
+        house_points=history.loc[history['Roll No'] == roll_number, ['Bonus', 'Reason']],
+        attendance={criterion: summary.loc[roll_number] for criterion, summary in model['attendance'].items()},
+        eligibility=model['eligibility'].loc[roll_number],
+        score_labels=labels,
+        scores=scores,
+        news_scores=news_score_tables(model['score_news_update'], labels),
+        theory_scores=pd.DataFrame({'Assessment': theory_scores, 'Score': [scores[column] for column in theory_scores]}),
+        practical_scores=pd.DataFrame({'Assessment': practical_scores, 'Score': [scores[column] for column in practical_scores]}),
+    )
+
+
+# View of a roll number in the session's snapshot, built once per snapshot version
+def student_view(roll_number):
+    key = (st.session_state.snapshot_version, roll_number)
+    return student_views().get(key, lambda: build_student_view(st.session_state, roll_number))
+
+
+# Open the spreadsheet by key if one is configured, skipping the Drive lookup by name
+def open_spreadsheet(client):
+    if 'sheet_key' in st.secrets:
+        return client.open_by_key(st.secrets['sheet_key'])
+    return client.open(sheet_name)
+
+
+# Cheap marker of the spreadsheet's revision: its Drive modifiedTime. None if it cannot be read,
+# in which case the records are always downloaded in full
+def spreadsheet_revision(client, spreadsheet_id):
+    try:
+        return client.get_file_drive_metadata(spreadsheet_id)['modifiedTime']
+    except Exception as error:
+        if is_quota_error(error):
+            raise
+        return None
+
+
+# Raised when the known columns of an attendance grid no longer match the sheet
+class ColumnsChanged(Exception):
+    pass
+
+
+# Number of date columns of an attendance grid. 'E' heads a grid without any classes yet
+def populated_columns(frame):
+    columns = list(frame.columns)
+    if not columns or columns[0] == 'E':
+        return 0
+    return len(columns)
+
+
+# A1 range of a frame from the given column offset on, keeping its header row
+def delta_range(frame, offset):
+    from gspread.utils import a1_range_to_grid_range, rowcol_to_a1
+    grid = a1_range_to_grid_range(frame)
+    start = rowcol_to_a1(grid['startRowIndex'] + 1, grid['startColumnIndex'] + 1 + offset)
+    end = rowcol_to_a1(grid['endRowIndex'], grid['endColumnIndex'])
+    return f'{start}:{end}'
+
+
+# Append the columns downloaded from offset on to the earlier columns of a cached grid.
+# The overlapping columns must still carry the same dates, or the grid is downloaded in full.
+# So is a grid that gained rows, e.g. when trailing blank rows were trimmed from the cached one
+def merge_columns(base, grid, offset):
+    if not grid:
+        raise ColumnsChanged
+    delta = df_with_header(grid)
+    if len(delta) > len(base):
+        raise ColumnsChanged
+    overlap = list(base.columns[offset:])
+    if list(delta.columns[:len(overlap)]) != overlap:
+        raise ColumnsChanged
+    merged = pd.concat([base.iloc[:, :offset], delta.reindex(range(len(base)))], axis=1)
+    return merged.astype(object).where(merged.notna(), None)
+
+
+# Ranges to download for each record, as (range, offset, base) per frame. Attendance grids
+# of the previous snapshot are only downloaded from their last populated columns on, less
+# an overlap window that catches edits to recent days, and merged into their base grid
+def download_plan(keys, previous=None, full=()):
+    overlap = st.secrets.get('sync_overlap_columns', 7)
+    plan = {}
+    for key in keys:
+        frames = record_ranges[key][1]
+        bases = [None] * len(frames)
+        if previous is not None and key in attendance_records and key not in full and key in previous.records:
+            cached = previous.records[key]
+            bases = cached if isinstance(cached, list) else [cached]
+        plan[key] = []
+        for frame, base in zip(frames, bases):
+            offset = max(populated_columns(base) - overlap, 0) if base is not None else 0
+            if offset == 0:
+                plan[key].append((frame, 0, None))
+            else:
+                plan[key].append((delta_range(frame, offset), offset, base))
+    return plan
+
+
+# Download the planned ranges with one values batch-get on the spreadsheet.
+# Returns the list of grids of each record, in the order of its frames
+def batch_download(spreadsheet, plan, registry):
+    from gspread.utils import absolute_range_name
+    ranges = []
+    for key, frames in plan.items():
+        worksheet = record_ranges[key][0]
+        ranges += [absolute_range_name(worksheet, frame) for frame, offset, base in frames]
+    with registry.time('stage_seconds', stage='download'):
+        response = spreadsheet.values_batch_get(ranges)
+    value_ranges = response['valueRanges']
+    registry.observe('download_cells', sum(len(row) for value_range in value_ranges for row in value_range.get('values', [])))
+    registry.observe('download_bytes', len(json.dumps(response).encode()))
+    value_ranges = iter(value_ranges)
+    downloaded = {}
+    for key, frames in plan.items():
+        downloaded[key] = [next(value_ranges).get('values', []) for frame in frames]
+    return downloaded
+
+
+# Convert the downloaded grids of a record into session state records
+def parse_record(key, grids, frames):
+    if key == 'scores':
+        return {'scores': df_with_header(grids[0]), 'score_news_update': grids[1][0][0]}
+    dataframes = []
+    for data, (frame, offset, base) in zip(grids, frames):
+        dataframes.append(df_with_header(data) if base is None else merge_columns(base, data, offset))
+    if key in ['houses'] + batch_sessions:
+        return {key: dataframes}
+    return {key: dataframes[0]}
+
+
+# Download and parse a single record, on a worker thread. The scheduler and registry
+# are passed in by the fetching thread
+def fetch_record(spreadsheet, key, frames, account, scheduler, registry):
+    scheduler.record(account)
+    return parse_record(key, batch_download(spreadsheet, {key: frames}, registry)[key], frames)
+
+
+# Download and parse the planned records, yielding each (key, record, error) as it completes.
+# One batch-get is tried first. If it fails, the worksheets are fetched concurrently
+# on a bounded thread pool instead. Records that could not be fetched yield their error
+def download_records(spreadsheet, plan, account, status, scheduler):
+    registry = metrics()
+    try:
+        scheduler.record(account)
+        downloaded = batch_download(spreadsheet, plan, registry)
+        status.write(f'{len(plan)} records downloaded')
+    except Exception as error:
+        # A throttled reader would only be throttled again by the per-worksheet fallback
+        if is_quota_error(error):
+            raise
+        downloaded = None
+        status.write(':orange[Batch download failed. Downloading worksheets in parallel]')
+    if downloaded is not None:
+        for key, frames in plan.items():
+            try:
+                yield key, parse_record(key, downloaded[key], frames), None
+            except Exception as error:
+                yield key, None, error
+        return
+    workers = min(st.secrets.get('fetch_workers', 4), len(plan))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(fetch_record, spreadsheet, key, frames, account, scheduler, registry): key
+                   for key, frames in plan.items()}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as error:
+                yield futures[future], None, error
+
+
+# Stand-in for st.status when fetching outside of a session, e.g. on a background thread
+class LogStatus:
+    def write(self, message):
+        logger.info(message)
+
+    def update(self, label=None, **kwargs):
+        if label is not None:
+            logger.info(label)
+
+
+# Status container that only shows its label. The log is held back, and only written
+# into the container if the fetch fails, so that it can be reported
+class QuietStatus:
+    def __init__(self, status):
+        self.status = status
+        self.messages = []
+
+    def write(self, message):
+        self.messages.append(message)
+
+    def update(self, label=None, **kwargs):
+        if kwargs.get('state') == 'error':
+            for message in self.messages:
+                self.status.write(message)
+            self.messages = []
+        self.status.update(label=label, **kwargs)
+
+
+# Fetch all worksheets into a dictionary of records. Log operations into status.
+# Reader accounts are handed out by the shared scheduler, and a failed attempt
+# only retries the records that are still missing.
+# Returns (records, source), or None on failure. Given the previous snapshot, the records
+# are None if the spreadsheet has not changed since, and nothing is downloaded.
+# Otherwise only new attendance columns are downloaded, except for a periodic full download
+def fetch_student_data(status=None, previous=None):
+    if status is None:
+        with st.status(f":blue[Fetched 0 / 7 records. Trying Reader 1 / {len(reader_accounts)}]", expanded=False) as status:
+            # There is no status container outside of a Streamlit server
+            if status is None:
+                status = LogStatus()
+            elif not st.secrets.get('verbose_status', False):
+                status = QuietStatus(status)
+            return fetch_student_data(status, previous)
+    scheduler = reader_scheduler()
+    number_of_accounts = len(reader_accounts)
+    # Full downloads reconcile corrections to older attendance columns
+    full_sync = previous is None or 'full_at' not in previous.source or \
+        (datetime.now() - datetime.fromisoformat(previous.source['full_at'])).total_seconds() >= st.secrets.get('full_sync_interval', 21600)
+    base = None if full_sync else previous
+    full = set()
+    records = {}
     i = 1
     fetched = 0
-    with st.status(f":blue[Fetched {fetched} / 7 records. Trying Reader {i} / {number_of_accounts}]", expanded=False) as status:
-        while i <= number_of_accounts and st.session_state.data_pulled == False:
-            account = accounts[i-1]
-            try:
-                st.write(f':blue[Authorizing {account}]')
+    while i <= number_of_accounts:
+        account = scheduler.acquire()
+        if account is None:
+            status.write(f':red[All reader accounts are resting. The next one is back in {round(scheduler.next_available())} seconds]')
+            break
+        try:
+            status.write(f':blue[Authorizing {account}]')
+            with metrics().time('stage_seconds', stage='authorize'):
                 client = authorize_client(account)
-                st.write(f'Trying to fetch records using {account}')
-                if 'houses' not in st.session_state:
-                    house_sheet = client.open(sheet_name).worksheet('Houses')
-                    st.write("Leaderboard worksheet found")
-                    house_data = house_sheet.batch_get(house_frames)
-                    st.write("Leaderboard data downloaded")
-                    leaderboard_dataframes = []
-                    for data in house_data:
-                        leaderboard_dataframes.append(df_with_header(data))
-                    st.write("Leaderboard data formatted")
-                    st.session_state.houses = leaderboard_dataframes
-                    st.write(f':green[Fetched House records using {account}]')
-                    fetched += 1
-                    status.update(label=f":blue[Fetched {fetched} / 7 records. Trying Reader {i} / {number_of_accounts}]")
-                if 'names' not in st.session_state:
-                    name_sheet = client.open(sheet_name).worksheet('Eligibility')
-                    st.write("Name worksheet found")
-                    name_data = name_sheet.get(name_frame)
-                    st.write("Name data downloaded")
-                    name_dataframe = df_with_header(name_data)
-                    st.write("Name data formatted")
-                    st.session_state.names = name_dataframe
-                    st.write(f':green[Fetched Name records using {account}]')
+            status.write(f'Trying to fetch records using {account}')
+            checked = not records and previous is not None and previous.source.get('revision')
+            if checked:
+                scheduler.record(account)
+                revision = spreadsheet_revision(client, previous.source['id'])
+                if revision == previous.source['revision']:
+                    scheduler.success(account)
+                    status.update(label=f":green[Records are up to date!]", state="complete", expanded=False)
+                    return None, previous.source
+            scheduler.record(account, 1 if 'sheet_key' in st.secrets else 2)
+            with metrics().time('stage_seconds', stage='open'):
+                spreadsheet = open_spreadsheet(client)
+            status.write('Spreadsheet found')
+            # Read the revision before downloading, so edits made during the download are caught next time.
+            # The revision just read to check for changes is that of the same spreadsheet
+            if not records:
+                if not checked or spreadsheet.id != previous.source['id']:
+                    scheduler.record(account)
+                    revision = spreadsheet_revision(client, spreadsheet.id)
+                source = {'id': spreadsheet.id, 'revision': revision,
+                          'full_at': datetime.now().isoformat() if full_sync else previous.source['full_at']}
+            # Records already fetched by a previous account are not downloaded again
+            pending = [key for key in record_ranges if key not in records]
+            errors = []
+            while pending and not errors:
+                plan = download_plan(pending, base, full)
+                pending = []
+                for key, record, error in download_records(spreadsheet, plan, account, status, scheduler):
+                    if isinstance(error, ColumnsChanged):
+                        status.write(f':orange[{record_ranges[key][0]} columns have changed. Downloading them in full]')
+                        full.add(key)
+                        pending.append(key)
+                        continue
+                    if error is not None:
+                        errors.append(error)
+                        status.write(f':red[Could not fetch {record_ranges[key][0]} records using {account}]')
+                        continue
+                    records.update(record)
+                    status.write(f':green[Fetched {record_ranges[key][0]} records using {account}]')
                     fetched += 1
                     status.update(label=f":blue[Fetched {fetched} / 7 records. Trying Reader {i} / {number_of_accounts}]")
-                if 'theory' not in st.session_state:
-                    theory_sheet = client.open(sheet_name).worksheet('Theory')
-                    st.write("Theory worksheet found")
-                    theory_data = theory_sheet.get(theory_frame)
-                    st.write("Theory data downloaded")
-                    theory_dataframe = df_with_header(theory_data)
-                    st.write("Theory data formatted")
-                    st.session_state.theory = theory_dataframe
-                    st.write(f':green[Fetched Theory records using {account}]')
-                    fetched += 1
-                    status.update(label=f":blue[Fetched {fetched} / 7 records. Trying Reader {i} / {number_of_accounts}]")
-                for batch in batch_sessions:
-                    if batch not in st.session_state:
-                        dataframes_sheet = client.open(sheet_name).worksheet(batch)
-                        st.write(f'{batch} worksheet found')
-                        dataframes_data = dataframes_sheet.batch_get(dataframes)
-                        st.write(f'{batch} data downloaded')
-                        batch_dataframes = []
-                        for data in dataframes_data:
-                            batch_dataframes += [df_with_header(data)]
-                        st.write(f'{batch} data formatted')
-                        st.session_state[batch] = batch_dataframes
-                        st.write(f':green[Fetched {batch} records using {account}]')
-                        fetched += 1
-                        status.update(label=f":blue[Fetched {fetched} / 7 records. Trying Reader {i} / {number_of_accounts}]")
-                if 'scores' not in st.session_state or 'score_news_update' not in st.session_state:
-                    scores_sheet = client.open(sheet_name).worksheet('Scores')
-                    st.write('Scores worksheet found')
-                    scores_data = scores_sheet.batch_get(scores_frames)
-                    st.write('Scores data downloaded')
-                    scores_dataframe = df_with_header(scores_data[0])
-                    score_news_update = scores_data[1][0][0]
-                    st.write('Scores data formatted')
-                    st.session_state.scores = scores_dataframe
-                    st.session_state.score_news_update = score_news_update
-                    st.write(f':green[Fetched Scores records using {account}]')
-                    fetched += 1
-                    status.update(label=f":blue[Fetched {fetched} / 7 records. Trying Reader {i} / {number_of_accounts}]")
-                if 'house_point_history' not in st.session_state:
-                    house_point_history_sheet = client.open(sheet_name).worksheet('House Point History')
-                    st.write('House Point History worksheet found')
-                    house_point_history_data = house_point_history_sheet.get(house_point_frame)
-                    st.write('House Point History data downloaded')
-                    house_point_history_dataframe = df_with_header(house_point_history_data)
-                    st.write('House Point History data formatted')
-                    st.session_state.house_point_history = house_point_history_dataframe
-                    st.write(f':green[Fetched House Point History records using {account}]')
-                    fetched += 1
-                    status.update(label=f":blue[Fetched {fetched} / 7 records. Trying Reader {i} / {number_of_accounts}]")
-                st.session_state.data_pulled = True
-                status.update(label=f":green[Fetched 7 / 7 records! Click to see status log]", state="complete", expanded=False)
-                return True
-            except:
-                i += 1
-                st.write(f':red[Could not fetch records using {account}]')
-                status.update(label=f":blue[Fetched {fetched} / 6 records. Trying Reader {i} / {number_of_accounts}]")
-                continue
-    status.update(label=f":red[Failed to fetch all records. Fetched {fetched} / 6 records. Click to see error log]", state="error", expanded=False)
-    return False
+            if errors:
+                raise next((error for error in errors if is_quota_error(error)), errors[0])
+            scheduler.success(account)
+            status.update(label=f":green[Fetched 7 / 7 records! Click to see status log]", state="complete", expanded=False)
+            return records, source
+        except Exception as error:
+            scheduler.failure(account, error)
+            i += 1
+            status.write(f':red[Could not fetch records using {account}]')
+            status.update(label=f":blue[Fetched {fetched} / 7 records. Trying Reader {i} / {number_of_accounts}]")
+            continue
+    status.update(label=f":red[Failed to fetch all records. Fetched {fetched} / 7 records. Click to see error log]", state="error", expanded=False)
+    return None
+
+
+# Latest shared snapshot, without waiting for a fetch. An expired snapshot keeps being
+# served while a fresh one is fetched in the background. None if there is no snapshot yet
+def current_snapshot():
+    store = snapshot_store()
+    snapshot = store.get()
+    if snapshot is None and store.current() is not None:
+        refresh_in_background(store)
+        snapshot = store.current()
+    return snapshot
+
+
+# Load student data into session state variables from the shared snapshot.
+# The snapshot is fetched while the session waits only if there is none at all
+def load_student_data():
+    store = snapshot_store()
+    snapshot = current_snapshot()
+    if snapshot is None:
+        # Sessions arriving during a fetch wait for it instead of starting their own
+        snapshot = store.flight.do('student_data', lambda: refresh_snapshot(store))
+    if snapshot is None:
+        return False
+    use_snapshot(snapshot)
+    return True
+
+
+# Fetch and publish a new snapshot, unless another session published one meanwhile
+# or a refresh is forced. An unchanged spreadsheet only renews the current snapshot.
+# Published snapshots are saved to disk for the next server start
+def refresh_snapshot(store, status=None, force=False):
+    snapshot = store.get()
+    if snapshot is not None and not force:
+        return snapshot
+    # Invalidated records are always downloaded again, even if the spreadsheet has not changed
+    previous = None if store.invalidated else store.current()
+    with metrics().time('stage_seconds', stage='fetch'):
+        fetched = fetch_student_data(status, previous)
+    if fetched is None:
+        store.mark_failed()
+        return None
+    records, source = fetched
+    if records is None:
+        return store.touch()
+    with metrics().time('stage_seconds', stage='prepare'):
+        snapshot = store.publish(records, source=source)
+    try:
+        save_snapshot(snapshot, snapshot_dir)
+    except Exception:
+        logger.exception('Could not save snapshot')
+    return snapshot
+
+
+# Refresh the snapshot on a background thread, at most one at a time
+def refresh_in_background(store):
+    if store.flight.busy('student_data') or not store.can_retry():
+        return
+    refresh = lambda: refresh_snapshot(store, LogStatus())
+    threading.Thread(target=store.flight.do, args=('student_data', refresh), daemon=True).start()
+
+
+# Seconds between scheduled refreshes. Records change more often during term,
+# so terms are refreshed more often. Without configured terms, every day is a term day
+def refresh_interval(today=None):
+    today = today or date.today()
+    terms = st.secrets.get('terms', [])
+    in_term = not terms or any(date.fromisoformat(start) <= today <= date.fromisoformat(end) for start, end in terms)
+    if in_term:
+        return st.secrets.get('refresh_interval_term', 900)
+    return st.secrets.get('refresh_interval_off_term', 3600)
+
+
+# Keep the shared snapshot warm. It is loaded straight away, then refreshed
+# whenever it is older than the refresh interval, until stop is set
+def refresh_on_schedule(store, stop):
+    while not stop.is_set():
+        interval = refresh_interval()
+        snapshot = store.current()
+        if (snapshot is None or snapshot.age() >= interval) and store.can_retry():
+            try:
+                store.flight.do('student_data', lambda: refresh_snapshot(store, LogStatus(), force=True))
+            except Exception:
+                logger.exception('Scheduled refresh failed')
+            snapshot = store.current()
+        # Wake up when the snapshot is next due. After a failed refresh, whether or not
+        # an older snapshot is still served, wait retry_after before trying again
+        wait = interval - snapshot.age() if snapshot is not None else store.retry_after
+        if not store.can_retry():
+            wait = store.retry_after
+        stop.wait(max(wait, 1))
+
+
+# Start the background refresher once per server process
+@st.cache_resource(show_spinner=False)
+def start_refresher():
+    stop = threading.Event()
+    if st.secrets.get('background_refresh', True):
+        threading.Thread(target=refresh_on_schedule, args=(snapshot_store(), stop),
+                         name='snapshot-refresher', daemon=True).start()
+    return stop
+
+
+# Point session state variables at the typed records of a snapshot. Nothing is copied
+def use_snapshot(snapshot):
+    for key, value in snapshot.model.items():
+        st.session_state[key] = value
+    st.session_state.snapshot_version = snapshot.version
+    st.session_state.data_date = snapshot.fetched_at.strftime("%d/%m/%Y %H:%M")
+    st.session_state.data_pulled = True
     
 
+# Bytes held by each attendance record as downloaded grids and as packed matrices
+def attendance_footprint(snapshot):
+    rows = []
+    for key in attendance_records:
+        grids = snapshot.records[key]
+        matrices = snapshot.model[key]
+        if not isinstance(grids, list):
+            grids, matrices = [grids], [matrices]
+        rows.append({
+            'records': key,
+            'grid (bytes)': int(sum(grid.memory_usage(deep=True).sum() for grid in grids)),
+            'packed (bytes)': sum(matrix.nbytes for matrix in matrices),
+        })
+    return rows
+
+
+# Operator view of the shared snapshot and its fetches
+@timed
+def render_operator_stats():
+    store = snapshot_store()
+    snapshot = store.current()
+    st.warning('##### 🛠️ Operator Stats')
+    st.write('###### Snapshot')
+    if snapshot is None:
+        st.write('No snapshot loaded yet')
+    else:
+        st.json({'version': snapshot.version, 'fetched_at': str(snapshot.fetched_at),
+                 'age_seconds': round(snapshot.age()), 'expired': store.get() is None})
+        st.write('###### Attendance Memory')
+        st.dataframe(pd.DataFrame(attendance_footprint(snapshot)), hide_index=True)
+    st.write('###### Fetches')
+    st.json(store.flight.stats())
+    st.write('###### Student Views')
+    st.json(student_views().stats())
+    st.write('###### AI Responses')
+    st.json(response_cache().stats())
+    st.write('###### AI Streaming')
+    latencies = list(ai_latencies())
+    st.json({'streams': len(latencies),
+             'median_first_token_seconds': round(median(first for first, total in latencies), 3) if latencies else None,
+             'median_total_seconds': round(median(total for first, total in latencies), 3) if latencies else None})
+    st.write('###### Gemini Keys')
+    pool = gemini_key_pool().stats()
+    st.json({name: value for name, value in pool.items() if name != 'keys'})
+    st.dataframe(pd.DataFrame(pool['keys']), hide_index=True)
+    st.write('###### Reader Accounts')
+    st.dataframe(pd.DataFrame(reader_scheduler().stats()), hide_index=True)
+
+
+# Metrics of the server process for admins, in the Prometheus text format
+@timed
+def render_metrics():
+    text = metrics().prometheus()
+    st.warning('##### 📈 Metrics')
+    st.download_button('Download', text, 'metrics.prom', 'text/plain')
+    st.code(text, language=None)
+
+
+# Eligibility of the whole cohort for admins, as CSV or Parquet
+@timed
+def render_eligibility_export():
+    snapshot = snapshot_store().current()
+    st.warning('##### 📜 Eligibility Export')
+    if snapshot is None:
+        st.write('No snapshot loaded yet')
+        return
+    table = snapshot.model['eligibility']
+    name = f'eligibility-{snapshot.fetched_at.strftime("%Y%m%d%H%M")}'
+    st.write(f'{int(table["Eligible"].sum())} of {len(table)} students eligible, as of {snapshot.fetched_at.strftime("%d/%m/%Y %H:%M")}')
+    st.download_button('Download CSV', table.to_csv().encode(), f'{name}.csv', 'text/csv')
+    parquet = io.BytesIO()
+    table.to_parquet(parquet)
+    st.download_button('Download Parquet', parquet.getvalue(), f'{name}.parquet', 'application/vnd.apache.parquet')
+
+
 # Display eligibility criteria for attendance
 def attendance_eligibility_criteria():
     # Attendance tab
@@ -232,6 +890,7 @@ def scores_eligibility_criteria():
 
 
 # Render house leaderboard
+@timed
 def render_leaderboard():
     
     houses = st.session_state.houses
@@ -243,17 +902,12 @@ def render_leaderboard():
 
     with tab1:
         st.warning('Hourglasses', icon="⌛")
-        house_leaderboard = houses[0]
-        house_leaderboard['Rank'] = house_leaderboard['Rank'].astype(int)
-        sorted_by_rank = house_leaderboard.sort_values(by='Rank')
-        sorted_by_rank.reset_index(drop=True, inplace=True)
+        sorted_by_rank = st.session_state.house_ranking
         for i in range(5):
             render_house_card(sorted_by_rank, i)
 
     with tab2:
         st.warning('Wall of Fame', icon="🌟")
-        house_point_history['Bonus'] = pd.to_numeric(house_point_history['Bonus'])
-        house_point_history['Roll No'] = pd.to_numeric(house_point_history['Roll No'])
         st.dataframe(house_point_history, hide_index=True)
         
     
@@ -270,7 +924,7 @@ def render_leaderboard():
             st.write(f''' 3. The Bonus component is awarded in recognition of achievements of the house members 
                     or deducted as disciplinary action at the discretion of the department. 
                     100 points are given to every house at the beginning. This can be a maximum of 200. ''')
-        st.image('images/Common.png')
+        st.image(asset_registry().data('Common.png'))
         
     with tab4:
         st.warning('Global Leaderboard', icon="📊")
@@ -287,8 +941,6 @@ def render_leaderboard():
             st.write(f''' 4. Tot Score - Total score of the student across all internal assessments. ''')
             st.write(f''' 5. Score Rank - Ranking of the student out of 250, based on total score. ''')
         leaderboard = houses[1]
-        for column in global_leaderboard_columns:
-            leaderboard[column] = pd.to_numeric(leaderboard[column])
         st.dataframe(leaderboard.loc[:, global_leaderboard_columns], hide_index=True)
     
     with tab5:
@@ -300,49 +952,34 @@ def render_leaderboard():
 
 
 # Render student profile
+@timed
 def render_profile(roll_number):
+    from streamlit_card import card
     # Profile tab
     st.warning('##### 👨‍⚕️ Student Profile')
-    names = st.session_state.names
-    name = names['Name'][roll_number-1]
+    view = student_view(roll_number)
     # Check access
-    if names['Access'][roll_number-1] == "YES":
-        st.session_state.access = True
-    else:
-        st.session_state.access = False
-    reg_no = names['Reg No'][roll_number-1]
-    st.write(f' 👋 Hi, {name.title()} !')
-    st.write(f' ⚕️ University Reg. No. - {reg_no}')
+    st.session_state.access = view.access
+    st.write(f' 👋 Hi, {view.name.title()} !')
+    st.write(f' ⚕️ University Reg. No. - {view.reg_no}')
     st.write(f' 🩺 Roll No. - {roll_number}')
     with st.expander(" 🌟 House Points Earned "):
-        house_point_history = st.session_state.house_point_history
-        house_point_history['Roll No'] = pd.to_numeric(house_point_history['Roll No'])
-        house_point_history['Bonus'] = pd.to_numeric(house_point_history['Bonus'])
-        personal_house_point_history = house_point_history[house_point_history['Roll No'] == roll_number]
-        st.dataframe(personal_house_point_history[['Bonus', 'Reason']], hide_index=True)
+        st.dataframe(view.house_points, hide_index=True)
     st.warning('##### 🪄 Wizard Pass')
-    index_hash = ((roll_number - 1) % 50) // 10
-    house = houses_list[index_hash]
-    data = format_image_file(f"images/{house}.png")
+    data = asset_registry().url(f"{view.house}.png")
     card(
         title=f' {roll_number} ',
-        text=[f'{name.title()}', f"{reg_no}"],
+        text=[f'{view.name.title()}', f"{view.reg_no}"],
         image=data
         )
     
 
 # Render house leaderboard
+@timed
 def render_house_leaderboard(roll_number):
-    houses = st.session_state.houses
-    index_hash = ((roll_number - 1) % 50) // 10
-    house = houses_list[index_hash]
-    st.image(f'images/{house}.png')
-    leaderboard = houses[index_hash + 2]
-    leaderboard['Tot Att'] = pd.to_numeric(leaderboard['Tot Att'])
-    leaderboard['Tot Class'] = pd.to_numeric(leaderboard['Tot Class'])
-    leaderboard['Attnd (%)'] = round(leaderboard['Tot Att'] * 100 / leaderboard['Tot Class'], 2).astype(float)
-    for column in house_leaderboard_columns:
-        leaderboard[column] = pd.to_numeric(leaderboard[column])
+    view = student_view(roll_number)
+    st.image(asset_registry().data(f'{view.house}.png'))
+    leaderboard = st.session_state.houses[view.house_index + 2]
     
     st.warning('House Leaderboard', icon="📊")
     with st.expander(" 📜 How to read the house leaderboard?"):
@@ -361,153 +998,88 @@ def render_house_leaderboard(roll_number):
         st.write(f''' 5. Tot Scr - Total score of the student across all internal assessments. ''')
         st.write(f''' 6. Scr Rnk Glb - Global Ranking of the student out of 250, based on total score. ''')
         st.write(f''' 7. Scr Rnk Hs - Intra-House Ranking of the student out of 50, based on total score. ''')
-    st.dataframe((houses[index_hash + 2]).loc[:, house_leaderboard_columns], hide_index=True)
+    st.dataframe(leaderboard.loc[:, house_leaderboard_columns], hide_index=True)
 
 
 # Render theory attendance
+@timed
 def render_theory(roll_number):
-    theory = st.session_state.theory
-    date_columns = list(theory.columns)
-    if date_columns[0] == 'E':
+    view = student_view(roll_number)
+    summary = view.attendance['Theory']
+    if not summary.conducted:
         st.write(f"###### Theory : No theory classes conducted yet")
         st.session_state.theory_attendance = 'No theory classes conducted yet'
         return
-    att_str = ''
-    abs_list = [f'(s.no. | yyyy-mm-dd | hh-hh)']
-    total = 0
-    attended = 0
-    errors = 0
-
-    for date in list(theory.columns):
-        if theory[date][roll_number-1] == 'P':
-            total += 1
-            attended += 1
-            att_str += f'✅'
-        elif theory[date][roll_number-1] == 'A':
-            total += 1
-            att_str += f'🆎'
-            abs_list += [f'{total} | {date}']
-        else:
-            errors += 1
-    
-    if total == attended:
+    abs_list = [f'(s.no. | yyyy-mm-dd | hh-hh)'] + summary.absences
+    if summary.total == summary.attended:
         abs_list = [' :green[No absences! Keep it up!] ']
 
-    if total > 0:
-        percentage = round(100 * attended / total,2)
-        if percentage < cutoff['Theory']:
+    if summary.total > 0:
+        percentage = summary.percentage
+        if not view.eligibility['Theory eligible']:
             eligibility = '🔴 :red[Not Eligible]'
-            st.session_state.eligible = False
         else:
             eligibility = '🟢 :green[Eligible]'
-        st.write(f"###### Theory : ( {attended} / {total} ) - ( {percentage} % ) - ( {eligibility} )")
+        st.write(f"###### Theory : ( {summary.attended} / {summary.total} ) - ( {percentage} % ) - ( {eligibility} )")
         st.session_state.theory_attendance = percentage
         with st.expander(" 🙋‍♂️ Theory Overview"):
-            st.write(att_str)
+            st.write(summary.overview)
         with st.expander(" 🆎 Theory Absence Details"):
             for absence in abs_list:
                 st.write(absence)            
     else:
         st.error('No records found for theory', icon="⚠️")
     
-    if errors > 0:
-        st.error(f'{errors} errors detected in theory records. Kindly notify the department office', icon="⚠️")
+    if summary.errors > 0:
+        st.error(f'{summary.errors} errors detected in theory records. Kindly notify the department office', icon="⚠️")
 
 
 # Render Practical and AETCOM attendance
+@timed
 def render_attendance(roll_number):
+    view = student_view(roll_number)
     for batch in batch_sessions:        
-        data = st.session_state[batch][(roll_number-1) // 50]
-        date_columns = list(data.columns)
-        if date_columns[0] == 'E':
+        summary = view.attendance[batch]
+        if not summary.conducted:
             st.write(f"###### {batch} : No {batch} sessions conducted yet")
             st.session_state[f'{batch}_attendance'] = f'No {batch} sessions conducted yet'
             continue
-        att_str = ''
         if batch == 'AETCOM':
-            abs_list = ['(s.no. | yyyy-mm-dd | module)']
+            abs_list = ['(s.no. | yyyy-mm-dd | module)'] + summary.absences
         if batch == 'Practical':
-            abs_list = ['(s.no. | yyyy-mm-dd | hh-hh | session)']
-        total = 0
-        attended = 0
-        errors = 0
-        
-        for date in date_columns:
-            if data[date][(roll_number-1) % 50] == 'P':
-                total += 1
-                attended += 1
-                att_str += f'✅'
-            elif data[date][(roll_number-1) % 50] == 'A':
-                total += 1
-                att_str += f'🆎'
-                abs_list += [f'{total} | {date}']
-            else:
-                errors += 1
-
-        if total == attended:
+            abs_list = ['(s.no. | yyyy-mm-dd | hh-hh | session)'] + summary.absences
+        if summary.total == summary.attended:
             abs_list = [' :green[No absences! Keep it up!] ']
 
-        if batch == 'Practical':
-            total = total * 2
-            attended = attended * 2
-            for date in date_columns:
-                if date[-3:] == 'ECE':
-                    if data[date][(roll_number-1) % 50] == 'P':
-                        total += 1
-                        attended += 1
-                    elif data[date][(roll_number-1) % 50] == 'A':
-                        total += 1
-                    else:
-                        errors += 1
-
-        if total > 0:
-            percentage = round(100 * attended / total,2)
-            if percentage < cutoff[batch]:
+        if summary.total > 0:
+            percentage = summary.percentage
+            if not view.eligibility[f'{batch} eligible']:
                 eligibility = '🔴 :red[Not Eligible]'
-                st.session_state.eligible = False
             else:
                 eligibility = '🟢 :green[Eligible]'
-            st.write(f"###### {batch} : ( {attended} / {total} ) - ( {percentage} % ) - ( {eligibility} )")
+            st.write(f"###### {batch} : ( {summary.attended} / {summary.total} ) - ( {percentage} % ) - ( {eligibility} )")
             st.session_state[f'{batch}_attendance'] = percentage
             with st.expander(f' 🙋‍♂️ {batch} Overview'):
-                st.write(att_str)
+                st.write(summary.overview)
             with st.expander(f" 🆎 {batch} Absences"):
                 for absence in abs_list:
                     st.write(absence)
         else:
             st.warning(f'No records found for {batch}', icon="⚠️")
 
-        if errors > 0:
-            st.error(f'{errors} errors detected in {batch} records. Kindly notify the department office', icon="⚠️")
+        if summary.errors > 0:
+            st.error(f'{summary.errors} errors detected in {batch} records. Kindly notify the department office', icon="⚠️")
 
 
 # Render scores
+@timed
 def render_scores(roll_number):
     # Scores tab
     st.warning('##### 💯 Scores')
     # Scores update news
     st.write(f'''###### 🥳 {st.session_state.score_news_update} ''')
     
-    scores = st.session_state.scores
-    
-    # Load formatted scores of student into dictionary
-    student_scores = {}
-    for column in scores_columns:
-        student_scores[column] = f'{scores[column][roll_number-1]} / {scores[column][250]}'
-
-    news = st.session_state.score_news_update
-
-    # Extract elements within parentheses using regular expression
-    matches = re.findall(r'\(([^)]+)\)', news)
-
-    # Separate the matches into two lists
-    if len(matches) >= 2:
-        theory_list = matches[0].split(', ')
-        practical_list = matches[1].split(', ')
-    else:
-        # Handle the case where there are not enough matches
-        theory_list = []
-        practical_list = []
+    view = student_view(roll_number)
     
     # Force columns on phone screens - must probably change every time the code changes
     st.write('''<style>
@@ -519,43 +1091,23 @@ def render_scores(roll_number):
                 </style>''', unsafe_allow_html=True)
     col1, col2 = st.columns(2)
     
-    try:
-        if len(theory_list) > 0:
-            theory_dict = {'Theory': [], 'Score': []}
-            for match in theory_list:
-                theory_dict['Theory'].append(match)
-                theory_dict['Score'].append(student_scores[match])
-            theory_df = pd.DataFrame(theory_dict)
-            with col1:
-                st.dataframe(theory_df, hide_index=True)
-    except:
-        pass
-
-    try:
-        if len(practical_list) > 0:
-            practical_dict = {'Practical': [], 'Score': []}
-            for match in practical_list:
-                practical_dict['Practical'].append(match)
-                practical_dict['Score'].append(student_scores[match])
-            practical_df = pd.DataFrame(practical_dict)
-            with col2:
-                st.dataframe(practical_df, hide_index=True)
-    except:
-        pass
+    # Assessments named in the scores update news
+    for column, table in zip([col1, col2], view.news_scores):
+        if table is not None:
+            with column:
+                st.dataframe(table, hide_index=True)
     
     # Check eligibility
-    if float(scores['Aggregate'][roll_number-1]) < 50:
-        st.session_state.eligible = False
+    eligibility = view.eligibility
+    if not eligibility['Aggregate eligible']:
         aggregate_eligibility = '🔴 :red[Not Eligible]'
     else:
         aggregate_eligibility = '🟢 :green[Eligible]'
-    if int(scores['Theory Total'][roll_number-1]) < 40:
-        st.session_state.eligible = False
+    if not eligibility['Theory Total eligible']:
         theory_eligibility = '🔴 :red[Not Eligible]'
     else:
         theory_eligibility = '🟢 :green[Eligible]'
-    if int(scores['Practical Total'][roll_number-1]) < 40:
-        st.session_state.eligible = False
+    if not eligibility['Practical Total eligible']:
         practical_eligibility = '🔴 :red[Not Eligible]'
     else:
         practical_eligibility = '🟢 :green[Eligible]'
@@ -563,39 +1115,19 @@ def render_scores(roll_number):
     news = st.session_state.score_news_update
     if news == end_of_year:
         # Display final scores
-        st.write(f"###### Theory Total : {student_scores['Theory Total']} ( {theory_eligibility} )")
-        st.write(f"###### Practical Total : {student_scores['Practical Total']} ( {practical_eligibility} )")
-        st.write(f"###### Aggregate Score : {student_scores['Aggregate']} ( {aggregate_eligibility} )")
+        st.write(f"###### Theory Total : {view.score_labels['Theory Total']} ( {theory_eligibility} )")
+        st.write(f"###### Practical Total : {view.score_labels['Practical Total']} ( {practical_eligibility} )")
+        st.write(f"###### Aggregate Score : {view.score_labels['Aggregate']} ( {aggregate_eligibility} )")
     
     # Display theory scores
     with st.expander(" 💯 Your Theory Scores"):
-        theory_scores_dict = {'Assessment': [], 'Score': []}
-        for column in theory_scores:
-            theory_scores_dict['Assessment'].append(column)
-            zeroes = scores[column].tolist().count('0')
-            if zeroes == 250:
-                theory_scores_dict['Score'].append('TBD')
-                student_scores[column] = 'TBD'
-            else:
-                theory_scores_dict['Score'].append(student_scores[column])
-        theory_scores_df = pd.DataFrame(theory_scores_dict)
-        st.dataframe(theory_scores_df, hide_index=True)
+        st.dataframe(view.theory_scores, hide_index=True)
     
     # Display practical scores
     with st.expander(" 💯 Your Practical Scores"):
-        practical_scores_dict = {'Assessment': [], 'Score': []}
-        for column in practical_scores:
-            practical_scores_dict['Assessment'].append(column)
-            zeroes = scores[column].tolist().count('0')
-            if zeroes == 250:
-                practical_scores_dict['Score'].append('TBD')
-                student_scores[column] = 'TBD'
-            else:
-                practical_scores_dict['Score'].append(student_scores[column])
-        practical_scores_df = pd.DataFrame(practical_scores_dict)
-        st.dataframe(practical_scores_df, hide_index=True)
+        st.dataframe(view.practical_scores, hide_index=True)
     
-    st.session_state.student_scores = student_scores
+    st.session_state.student_scores = view.scores
 
     scores_eligibility_criteria()
 
@@ -685,11 +1217,30 @@ def failed_to_fetch():
 
 # AI Query
 def ai_query(limit):
+    return feedback_prompt(limit, st.session_state.theory_attendance, st.session_state.Practical_attendance,
+                           st.session_state.AETCOM_attendance, st.session_state.student_scores)
+
+
+# Attendance the student pages leave in session state for the AI prompt: the percentage,
+# or a message if no sessions were conducted yet
+def prompt_attendance(view):
+    values = []
+    for criterion, message in [('Theory', 'No theory classes conducted yet'),
+                               ('Practical', 'No Practical sessions conducted yet'),
+                               ('AETCOM', 'No AETCOM sessions conducted yet')]:
+        summary = view.attendance[criterion]
+        if not summary.conducted:
+            values.append(message)
+        elif summary.total > 0:
+            values.append(summary.percentage)
+        else:
+            values.append(0)
+    return values
+
+
+# Prompt of the AI feedback of a student with a word limit
+def feedback_prompt(limit, theory_attendance, practical_attendance, aetcom_attendance, student_scores):
     word_limit = word_limits[limit]
-    theory_attendance = st.session_state.theory_attendance
-    practical_attendance = st.session_state.Practical_attendance
-    aetcom_attendance = st.session_state.AETCOM_attendance
-    student_scores = st.session_state.student_scores
     scores_part_of_query = "The student's theory scores are - "
     theory_pending = []
     for assessment in theory_scores:
@@ -764,32 +1315,118 @@ def ai_query(limit):
     return query
 
 
-def ai_feedback(limit):
-    api_keys = ['API_key_1', 'API_key_2', 'API_key_3', 'API_key_4']
-    random_api_key = random.choice(api_keys)
-    my_api_key = st.secrets[random_api_key]
-    genai.configure(api_key=my_api_key)
-    model = genai.GenerativeModel('gemini-pro')
+# Feedback text for the prompt of a word limit. The same prompt is answered from the
+# response cache unless a fresh response is asked for, which then replaces the cached one
+def ai_feedback(limit, fresh=False):
+    query = ai_query(limit)
+    key = prompt_key('gemini-pro', query)
+    cache = response_cache()
+    if not fresh:
+        text = cache.get(key)
+        if text is not None:
+            return text
+    text = gemini_key_pool().call(lambda name: gemini_generate(name, query))
+    cache.put(key, text)
+    return text
+
+
+# Feedback text for the prompt of a word limit as it is generated, yielding the text so far.
+# A cached response is yielded whole. A stream failing before its first chunk is asked
+# again with another key, once per key. A completed stream is cached like ai_feedback
+def ai_feedback_stream(limit, fresh=False):
     query = ai_query(limit)
-    response = model.generate_content(query)
-    return response
+    key = prompt_key('gemini-pro', query)
+    cache = response_cache()
+    if not fresh:
+        text = cache.get(key)
+        if text is not None:
+            yield text
+            return
+    pool = gemini_key_pool()
+    started = time.monotonic()
+    for attempt in range(len(gemini_keys)):
+        name = pool.acquire()
+        first_token = None
+        text = ''
+        try:
+            for chunk in gemini_stream(name, query):
+                if first_token is None:
+                    first_token = time.monotonic() - started
+                text += chunk
+                yield text
+        except Exception as error:
+            pool.failure(name, error)
+            if first_token is not None or attempt == len(gemini_keys) - 1:
+                raise
+            continue
+        break
+    pool.success(name)
+    # An empty stream has no first token, and no answer worth keeping
+    if first_token is not None:
+        ai_latencies().append((first_token, time.monotonic() - started))
+        cache.put(key, text)
+
+
+# Ask Gemini with one API key
+def gemini_generate(name, query):
+    import google.generativeai as genai
+    genai.configure(api_key=st.secrets[name])
+    model = genai.GenerativeModel('gemini-pro')
+    return model.generate_content(query).text
 
 
-def ai_render(limit):
+# Ask Gemini with one API key, yielding the text of each chunk of the answer as it arrives
+def gemini_stream(name, query):
+    import google.generativeai as genai
+    genai.configure(api_key=st.secrets[name])
+    model = genai.GenerativeModel('gemini-pro')
+    for chunk in model.generate_content(query, stream=True):
+        yield chunk.text
+
+
+def ai_render(limit, fresh=False):
+    if st.secrets.get('ai_streaming', True):
+        ai_render_stream(limit, fresh)
+        return
     with st.spinner(''' ##### 🔮 The all-seeing magic crystal ball is looking into you '''):
+        busy = False
         try:
-            ai_response = ai_feedback(limit)
+            ai_response = ai_feedback(limit, fresh)
             ai_success = True
+        except KeyPoolBusy:
+            ai_success = False
+            busy = True
         except:
             ai_success = False
         if ai_success:
-            st.write(ai_response.text)
+            st.write(ai_response)
+        elif busy:
+            st.write(" 🔮 The all-seeing magic crystal ball is busy with other seekers. Please try again in a few seconds.")
         else:
             st.write(" 🔮 The all-seeing magic crystal ball is dreaming. It will be back with you in a minute.")
             st.write(''' 😴 When the crystal ball is used too frequently, it overheats and goes to sleep.
                      But worry not, it will only take a short nap of 60 seconds. Please try again after a minute.  ''')
 
 
+# Render feedback into a placeholder as it is generated
+def ai_render_stream(limit, fresh=False):
+    placeholder = st.empty()
+    placeholder.write(''' ##### 🔮 The all-seeing magic crystal ball is looking into you ''')
+    try:
+        ai_response = ''
+        for ai_response in ai_feedback_stream(limit, fresh):
+            placeholder.write(ai_response + ' ▌')
+        placeholder.write(ai_response)
+    except KeyPoolBusy:
+        placeholder.write(" 🔮 The all-seeing magic crystal ball is busy with other seekers. Please try again in a few seconds.")
+    except Exception:
+        with placeholder.container():
+            st.write(" 🔮 The all-seeing magic crystal ball is dreaming. It will be back with you in a minute.")
+            st.write(''' 😴 When the crystal ball is used too frequently, it overheats and goes to sleep.
+                     But worry not, it will only take a short nap of 60 seconds. Please try again after a minute.  ''')
+
+
+@timed
 def render_divination():
     st.warning('##### 🔮 Divination')
     st.write('##### 🔮 The all-seeing magic crystal ball offers its divination services!')
@@ -807,32 +1444,28 @@ def render_divination():
         medium = st.button(" 🪄 Divine! ")
     with col3:
         long = st.button(" 🪄 More! ")
+    fresh = st.checkbox(" 🎲 Fresh divination", help='Look into the crystal ball again instead of recalling its last divination')
     if short:
-        ai_render('short')
+        ai_render('short', fresh)
     elif long:
-        ai_render('long')
+        ai_render('long', fresh)
     elif medium:
-        ai_render('medium')
+        ai_render('medium', fresh)
     else:
-        st.write(''' 🪄 You can try generating your feedback multiple times by clicking on the buttons above, 
-                based on how long you want your response to be. ''')
+        st.write(''' 🪄 You can generate your feedback by clicking on the buttons above, 
+                based on how long you want your response to be. The crystal ball recalls its divination 
+                until your records change. Tick Fresh divination to have it look again. ''')
     with st.expander(" 📜 Disclaimers "):
         ai_disclaimers()
 
 
-def format_image_file(image_file):
-    with open(image_file, "rb") as f:
-        data = f.read()
-        encoded = base64.b64encode(data)
-    data = "data:image/png;base64," + encoded.decode("utf-8")
-    return data
-
-
+@timed
 def render_house_card(leaderboard, index):
+    from streamlit_card import card
     house = leaderboard.loc[index,'House']
     total = leaderboard.loc[index,'Total']
     rank = leaderboard.loc[index,'Rank']
-    data = format_image_file(f"images/{house}.png")
+    data = asset_registry().url(f"{house}.png")
     card(
         title=f" ⌛ {total} ⌛ ",
         text=[medals[str(rank)], f"Rank : {rank}"],
@@ -840,6 +1473,7 @@ def render_house_card(leaderboard, index):
         )
 
 
+@timed
 def render_eligibility():
     if st.session_state.eligible:
         st.balloons()
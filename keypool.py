@@ -0,0 +1,149 @@
+import random
+import threading
+import time
+
+from scheduler import is_quota_error
+
+
+# Raised when no key frees up in time, or too many requests are already waiting for one
+class KeyPoolBusy(Exception):
+    pass
+
+
+# Usage, health and token bucket of one API key
+class PoolKey:
+    def __init__(self, name, burst):
+        self.name = name
+        self.tokens = float(burst)
+        self.refilled_at = None
+        self.requests = 0
+        self.successes = 0
+        self.errors = 0
+        self.quota_errors = 0
+        self.strikes = 0
+        self.cooldown_until = 0.0
+
+
+# Hands out API keys within their rate limits. Each key has a token bucket of burst tokens
+# refilled at rate requests per `per` seconds. Requests take a token from the key with the
+# most tokens. When every key is empty or cooling down, up to max_waiting requests wait up
+# to max_wait seconds for one; any more fail right away. Rate limit errors empty a key's
+# bucket and cool it down with jittered exponential backoff
+class KeyPool:
+    def __init__(self, keys, rate=60, per=60, burst=None, max_waiting=16, max_wait=10,
+                 cooldown=30, max_cooldown=600, clock=time.monotonic):
+        self.rate = rate / per
+        self.burst = burst or rate
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self._ready = threading.Condition()
+        self._keys = {name: PoolKey(name, self.burst) for name in keys}
+        self.waiting = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.rejected = 0
+
+    def _refill(self, key, now):
+        if key.refilled_at is not None:
+            key.tokens = min(float(self.burst), key.tokens + (now - key.refilled_at) * self.rate)
+        key.refilled_at = now
+
+    # Take a token from the fullest available key. Returns the key name, or None and
+    # the seconds until a key may be available
+    def _take(self, now):
+        available = []
+        delays = []
+        for key in self._keys.values():
+            self._refill(key, now)
+            if key.cooldown_until > now:
+                delays.append(key.cooldown_until - now)
+            elif key.tokens < 1:
+                delays.append((1 - key.tokens) / self.rate)
+            else:
+                available.append(key)
+        if not available:
+            return None, min(delays, default=self.max_wait)
+        most = max(key.tokens for key in available)
+        key = random.choice([key for key in available if key.tokens == most])
+        key.tokens -= 1
+        key.requests += 1
+        return key.name, 0.0
+
+    # Name of a key with capacity, waiting for one if need be
+    def acquire(self):
+        started = self.clock()
+        with self._ready:
+            name, delay = self._take(started)
+            if name is not None:
+                return name
+            if self.waiting >= self.max_waiting:
+                self.rejected += 1
+                raise KeyPoolBusy('Too many requests are waiting for an API key')
+            self.waiting += 1
+            try:
+                while name is None:
+                    remaining = started + self.max_wait - self.clock()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise KeyPoolBusy('No API key freed up in time')
+                    self._ready.wait(min(delay, remaining))
+                    name, delay = self._take(self.clock())
+                self.waited += 1
+                self.wait_seconds += self.clock() - started
+                return name
+            finally:
+                self.waiting -= 1
+
+    def success(self, name):
+        with self._ready:
+            key = self._keys[name]
+            key.successes += 1
+            key.strikes = 0
+
+    # Rate limit errors empty the key's bucket and cool it down. Repeated ones double
+    # the cool-down, up to max_cooldown
+    def failure(self, name, error):
+        with self._ready:
+            key = self._keys[name]
+            key.errors += 1
+            if is_quota_error(error):
+                key.quota_errors += 1
+                key.strikes += 1
+                delay = min(self.cooldown * 2 ** (key.strikes - 1), self.max_cooldown)
+                key.tokens = 0.0
+                key.cooldown_until = self.clock() + delay * random.uniform(0.75, 1.25)
+            # Let waiting requests pick another key
+            self._ready.notify_all()
+
+    # Run request(name) with a key, recording how it went
+    def call(self, request):
+        name = self.acquire()
+        try:
+            result = request(name)
+        except Exception as error:
+            self.failure(name, error)
+            raise
+        self.success(name)
+        return result
+
+    def stats(self):
+        with self._ready:
+            now = self.clock()
+            keys = []
+            for key in self._keys.values():
+                self._refill(key, now)
+                keys.append({
+                    'key': key.name,
+                    'tokens': round(key.tokens, 1),
+                    'requests': key.requests,
+                    'successes': key.successes,
+                    'errors': key.errors,
+                    'quota errors': key.quota_errors,
+                    'cooldown (s)': round(max(0.0, key.cooldown_until - now)),
+                })
+            return {'waiting': self.waiting, 'max_waiting': self.max_waiting, 'waited': self.waited,
+                    'average_wait_seconds': round(self.wait_seconds / self.waited, 3) if self.waited else 0.0,
+                    'rejected': self.rejected, 'keys': keys}
@@ -0,0 +1,89 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+# Upper bounds of the buckets of durations, in seconds, and of sizes, in cells or bytes
+time_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+size_buckets = (10, 100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+# Counts of observed values per bucket, with their sum and maximum
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+
+# Histograms of the server process, by metric name and labels. Durations and sizes are
+# observed from any thread, and exported as Prometheus text or as a one line summary
+class MetricsRegistry:
+    def __init__(self, prefix='', clock=time.perf_counter):
+        self.prefix = prefix
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._help = {}
+
+    # Describe a metric and its buckets. Metrics that are not described have time buckets
+    def describe(self, name, help, buckets=time_buckets):
+        self._help[name] = (help, buckets)
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._metrics.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram(self._help.get(name, (None, time_buckets))[1])
+            series[key].observe(value)
+
+    # Observe the seconds spent in the with block, even if it raises
+    @contextmanager
+    def time(self, name, **labels):
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.observe(name, self.clock() - started, **labels)
+
+    # Histograms in the Prometheus text exposition format
+    def prometheus(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._metrics.items()):
+                metric = self.prefix + name
+                help = self._help.get(name, (None,))[0]
+                if help:
+                    lines.append(f'# HELP {metric} {help}')
+                lines.append(f'# TYPE {metric} histogram')
+                for key, histogram in sorted(series.items()):
+                    labels = ''.join(f'{label}="{value}",' for label, value in key)
+                    cumulative = 0
+                    for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{{labels}le="{bound}"}} {cumulative}')
+                    braces = f'{{{labels.rstrip(",")}}}' if labels else ''
+                    lines.append(f'{metric}_sum{braces} {histogram.sum:.6g}')
+                    lines.append(f'{metric}_count{braces} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    # Count, mean and maximum of every series, on one line
+    def summary(self):
+        parts = []
+        with self._lock:
+            for name, series in sorted(self._metrics.items()):
+                for key, histogram in sorted(series.items()):
+                    labels = ','.join(f'{label}={value}' for label, value in key)
+                    parts.append(f'{name}{{{labels}}} n={histogram.count} '
+                                 f'mean={histogram.sum / histogram.count:.4g} max={histogram.max:.4g}')
+        return '; '.join(parts)
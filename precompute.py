@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from helpers import *
+
+
+# AI feedback prompts of every student of a snapshot, as (roll number, limit, prompt key, prompt).
+# They are built the way the student pages build them, so the results answer those pages
+def feedback_prompts(snapshot, limits, rolls=range(1, 251)):
+    prompts = []
+    for roll_number in rolls:
+        view = build_student_view(snapshot.model, roll_number)
+        theory_attendance, practical_attendance, aetcom_attendance = prompt_attendance(view)
+        for limit in limits:
+            prompt = feedback_prompt(limit, theory_attendance, practical_attendance, aetcom_attendance, view.scores)
+            prompts.append((roll_number, limit, prompt_key('gemini-pro', prompt), prompt))
+    return prompts
+
+
+# Prompt keys answered by an earlier run. Keys change with the prompts, so
+# answers of older records are not taken for newer ones
+def read_checkpoint(path):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)['key'])
+            except (ValueError, KeyError):
+                continue
+    return done
+
+
+# Answer the prompts on a bounded pool of workers, within the key pool's rate limits.
+# Answers go into the response cache and each is recorded in the checkpoint, so an
+# interrupted run resumes where it stopped. Answers that have since expired from the
+# cache are asked again. Prompts still failing after attempts, or whose answer could
+# not be stored, are left for the next run. Returns the number of prompts answered and failed
+def precompute_feedback(prompts, pool, cache, checkpoint, generate=gemini_generate, workers=4, attempts=3):
+    done = read_checkpoint(checkpoint)
+    pending = [prompt for prompt in prompts if prompt[2] not in done or cache.get(prompt[2]) is None]
+    logger.info(f'{len(prompts) - len(pending)} / {len(prompts)} prompts already answered')
+    lock = threading.Lock()
+
+    def answer(roll_number, limit, key, prompt):
+        for attempt in range(attempts):
+            try:
+                text = pool.call(lambda name: generate(name, prompt))
+                break
+            except KeyPoolBusy:
+                time.sleep(pool.max_wait)
+            except Exception as error:
+                logger.warning(f'Roll {roll_number} {limit}: {error}')
+                time.sleep(2 ** attempt)
+        else:
+            return False
+        cache.put(key, text)
+        with lock:
+            with open(checkpoint, 'a') as f:
+                f.write(json.dumps({'key': key, 'roll': roll_number, 'limit': limit, 'text': text}) + '\n')
+        return True
+
+    answered = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(answer, *prompt): prompt for prompt in pending}
+        for future in as_completed(futures):
+            try:
+                ok = future.result()
+            except Exception as error:
+                roll_number, limit = futures[future][:2]
+                logger.warning(f'Roll {roll_number} {limit}: could not store the answer: {error}')
+                ok = False
+            if ok:
+                answered += 1
+            else:
+                failed += 1
+            if (answered + failed) % 25 == 0:
+                logger.info(f'{answered + failed} / {len(pending)} prompts done, {failed} failed')
+    return answered, failed
+
+
+# Precompute the AI feedback of the cohort from the saved snapshot, or a fresh one.
+# Answers are cached in ai_cache_dir, where the app finds them
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute AI feedback for every student')
+    parser.add_argument('--limits', default='short,medium,long', help='Comma separated word limits')
+    parser.add_argument('--rolls', help='Roll numbers as first-last, all by default')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--checkpoint', default='feedback-checkpoint.jsonl')
+    args = parser.parse_args()
+
+    if not st.secrets.get('ai_cache_dir'):
+        raise SystemExit('Set ai_cache_dir in the secrets so that the app can find the answers')
+    store = snapshot_store()
+    snapshot = refresh_snapshot(store, LogStatus()) or store.current()
+    if snapshot is None:
+        raise SystemExit('No snapshot of the student records could be loaded')
+    rolls = range(1, 251)
+    if args.rolls:
+        first, last = args.rolls.split('-')
+        rolls = range(int(first), int(last) + 1)
+    prompts = feedback_prompts(snapshot, args.limits.split(','), rolls)
+    answered, failed = precompute_feedback(prompts, gemini_key_pool(), response_cache(), args.checkpoint, workers=args.workers)
+    logger.info(f'Answered {answered} prompts, {failed} failed')
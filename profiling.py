@@ -0,0 +1,35 @@
+import cProfile
+import os
+import re
+from datetime import datetime
+
+
+# Profiler of the calls of the current thread, already running. None if another
+# profiler is running, which Python allows only one of at a time since 3.12
+def start_profile():
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        return None
+    return profile
+
+
+# File name of a rerun profile, sortable by time. Parts are made safe for any file system
+def profile_name(version, roll_number, page, now=None):
+    now = now or datetime.now()
+    parts = [now.strftime('%Y%m%d-%H%M%S-%f'), f'v{version}', f'roll-{roll_number}', page]
+    return '_'.join(re.sub(r'[^A-Za-z0-9.-]', '-', str(part)) for part in parts) + '.pstats'
+
+
+# Stop a profile and save it into directory, keeping only the latest keep profiles there.
+# Returns the path of the saved profile
+def save_profile(profile, directory, name, keep=20):
+    profile.disable()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    profile.dump_stats(path)
+    saved = sorted(entry.name for entry in os.scandir(directory) if entry.name.endswith('.pstats'))
+    for old in saved[:-keep] if keep > 0 else []:
+        os.remove(os.path.join(directory, old))
+    return path
@@ -0,0 +1,54 @@
+import pandas as pd
+
+
+# House of each roll number. Every batch of 50 is split into five houses of 10 consecutive students
+def house_of(rolls):
+    return ((rolls - 1) % 50) // 10
+
+
+# Competition ranks, highest value first. Students without a value rank last
+def _rank(values):
+    return values.rank(method='min', ascending=False, na_option='bottom').astype(int)
+
+
+# Attendance and score of every student with their global and intra-house ranks.
+# Attendance is counted in hours across all the sessions of the attendance summaries,
+# and the total score is the theory total plus the practical total
+def student_ranking(attendance, scores, students=250):
+    rolls = pd.RangeIndex(1, students + 1)
+    ranking = pd.DataFrame({'Roll No.': rolls, 'House': house_of(rolls)}, index=rolls)
+    ranking['Tot Att'] = sum(summary['attended'].reindex(rolls, fill_value=0) for summary in attendance.values())
+    ranking['Tot Class'] = sum(summary['total'].reindex(rolls, fill_value=0) for summary in attendance.values())
+    ranking['Attnd (%)'] = round(ranking['Tot Att'] * 100 / ranking['Tot Class'], 2).astype(float)
+    totals = scores['Theory Total'].iloc[:students] + scores['Practical Total'].iloc[:students]
+    ranking['Tot Score'] = totals.to_numpy(dtype=float)
+
+    ranking['Att Rank'] = _rank(ranking['Attnd (%)'])
+    ranking['Score Rank'] = _rank(ranking['Tot Score'])
+    members = ranking.groupby('House')
+    ranking['Att Rnk Hs'] = members['Attnd (%)'].transform(_rank)
+    ranking['Scr Rnk Hs'] = members['Tot Score'].transform(_rank)
+    return ranking.reset_index(drop=True)
+
+
+# Leaderboard of each house, in house order, with the house column names
+def house_leaderboards(ranking, houses=5):
+    leaderboard = ranking.rename(columns={'Att Rank': 'Att Rnk Glb', 'Tot Score': 'Tot Scr', 'Score Rank': 'Scr Rnk Glb'})
+    return [leaderboard[leaderboard['House'] == house].reset_index(drop=True) for house in range(houses)]
+
+
+# House points table with the attendance and scores components derived from the ranking.
+# Each component is the house average scaled to a maximum of 400. Bonus points are kept
+# from the points table. house_names gives the house of each name in house order
+def house_points(points, ranking, house_names, maximum_score):
+    members = ranking.groupby('House')
+    attendance = round(members['Attnd (%)'].mean() * 4, 2)
+    scores = round(members['Tot Score'].mean() * 400 / maximum_score, 2)
+    table = points.copy()
+    house = table['House'].map({name: index for index, name in enumerate(house_names)})
+    table['Attendance'] = house.map(attendance)
+    table['Scores'] = house.map(scores)
+    table['Bonus'] = pd.to_numeric(table['Bonus'], errors='coerce')
+    table['Total'] = round(table[['Attendance', 'Scores', 'Bonus']].sum(axis=1), 2)
+    table['Rank'] = _rank(table['Total'])
+    return table
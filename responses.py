@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+# Key of a response: the hash of the model name and the final prompt
+def prompt_key(model, prompt):
+    return hashlib.sha256(f'{model}\n{prompt}'.encode('utf-8')).hexdigest()
+
+
+# Least recently used cache of response texts by prompt key. Entries expire after ttl
+# seconds. With a directory, each entry is also kept in a file there. Files are read back
+# by the next process, and on a miss, so entries written by other processes are found
+class ResponseCache:
+    def __init__(self, ttl=86400, size=1024, directory=None, clock=time.time):
+        self.ttl = ttl
+        self.size = size
+        self.directory = directory
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    # Read the saved entries, oldest first, dropping expired and unreadable ones
+    def _load(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path) as f:
+                    entry = json.load(f)
+                entries.append((entry['created'], name[:-len('.json')], entry['text']))
+            except Exception:
+                continue
+        for created, key, text in sorted(entries):
+            if self.clock() - created <= self.ttl:
+                self._entries[key] = (created, text)
+            else:
+                self._remove(key)
+        while len(self._entries) > self.size:
+            self._remove(self._entries.popitem(last=False)[0])
+
+    def _read(self, key):
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+            return entry['created'], entry['text']
+        except Exception:
+            return None
+
+    def _remove(self, key):
+        if self.directory:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    # Cached text of a key, or None if there is none or it has expired
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self.directory:
+                entry = self._read(key)
+                if entry is not None:
+                    self._entries[key] = entry
+                    while len(self._entries) > self.size:
+                        self._remove(self._entries.popitem(last=False)[0])
+            if entry is not None and self.clock() - entry[0] > self.ttl:
+                del self._entries[key]
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, text):
+        created = self.clock()
+        with self._lock:
+            self._entries[key] = (created, text)
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.size:
+                evicted.append(self._entries.popitem(last=False)[0])
+        if self.directory:
+            for old in evicted:
+                self._remove(old)
+            # Each writer has its own temporary file, so concurrent puts of a key do not collide
+            descriptor, temporary = tempfile.mkstemp(dir=self.directory, prefix=f'{key}.', suffix='.tmp')
+            try:
+                with os.fdopen(descriptor, 'w') as f:
+                    json.dump({'created': created, 'text': text}, f)
+                os.replace(temporary, self._path(key))
+            except BaseException:
+                try:
+                    os.remove(temporary)
+                except OSError:
+                    pass
+                raise
+
+    def stats(self):
+        return {'responses': len(self._entries), 'size': self.size, 'hits': self.hits, 'misses': self.misses}
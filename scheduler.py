@@ -0,0 +1,115 @@
+import random
+import threading
+import time
+from collections import deque
+
+
+# True for Google API 429 / quota exhaustion errors
+def is_quota_error(error):
+    response = getattr(error, 'response', None)
+    if getattr(response, 'status_code', None) == 429:
+        return True
+    message = str(error).lower()
+    return 'quota' in message or 'rate_limit' in message or 'rate limit' in message
+
+
+# Usage and health of one reader account
+class ReaderAccount:
+    def __init__(self, name):
+        self.name = name
+        self.recent = deque()
+        self.requests = 0
+        self.successes = 0
+        self.errors = 0
+        self.quota_errors = 0
+        self.strikes = 0
+        self.cooldown_until = 0.0
+
+
+# Hands out reader accounts. Requests are counted per account over a sliding window,
+# and the least loaded account that is not cooling down and is under its limit is picked.
+# Quota errors cool an account down with jittered exponential backoff
+class ReaderScheduler:
+    def __init__(self, accounts, limit=60, window=60, cooldown=30, max_cooldown=600, clock=time.monotonic):
+        self.limit = limit
+        self.window = window
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._accounts = {name: ReaderAccount(name) for name in accounts}
+
+    def _trim(self, account, now):
+        while account.recent and account.recent[0] <= now - self.window:
+            account.recent.popleft()
+
+    # Least loaded healthy account, or None if every account is cooling down or saturated
+    def acquire(self):
+        with self._lock:
+            now = self.clock()
+            healthy = []
+            for account in self._accounts.values():
+                self._trim(account, now)
+                if account.cooldown_until <= now and len(account.recent) < self.limit:
+                    healthy.append(account)
+            if not healthy:
+                return None
+            lowest = min(len(account.recent) for account in healthy)
+            return random.choice([account for account in healthy if len(account.recent) == lowest]).name
+
+    # Count API requests made with an account
+    def record(self, name, requests=1):
+        with self._lock:
+            account = self._accounts[name]
+            now = self.clock()
+            account.recent.extend([now] * requests)
+            account.requests += requests
+
+    def success(self, name):
+        with self._lock:
+            account = self._accounts[name]
+            account.successes += 1
+            account.strikes = 0
+
+    # Cool an account down. Repeated quota errors double the cool-down, up to max_cooldown
+    def failure(self, name, error):
+        with self._lock:
+            account = self._accounts[name]
+            account.errors += 1
+            if is_quota_error(error):
+                account.quota_errors += 1
+                account.strikes += 1
+                delay = min(self.cooldown * 2 ** (account.strikes - 1), self.max_cooldown)
+            else:
+                delay = self.cooldown
+            account.cooldown_until = self.clock() + delay * random.uniform(0.75, 1.25)
+
+    # Seconds until the next account is available again
+    def next_available(self):
+        with self._lock:
+            now = self.clock()
+            available = []
+            for account in self._accounts.values():
+                self._trim(account, now)
+                at = account.cooldown_until
+                if len(account.recent) >= self.limit:
+                    at = max(at, account.recent[len(account.recent) - self.limit] + self.window)
+                available.append(at)
+            return max(0.0, min(available) - now)
+
+    def stats(self):
+        with self._lock:
+            now = self.clock()
+            rows = []
+            for account in self._accounts.values():
+                self._trim(account, now)
+                rows.append({
+                    'account': account.name,
+                    'recent requests': len(account.recent),
+                    'requests': account.requests,
+                    'successes': account.successes,
+                    'errors': account.errors,
+                    'quota errors': account.quota_errors,
+                    'cooldown (s)': round(max(0.0, account.cooldown_until - now)),
+                })
+            return rows
@@ -0,0 +1,239 @@
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from types import MappingProxyType
+
+import pandas as pd
+import pyarrow as pa
+
+
+# Read-only set of student records shared by every session of the server process
+# Records are the raw worksheet grids and model is what sessions read, prepared from them.
+# Source holds the spreadsheet id and the revision the records were fetched at.
+# checked_at is when the spreadsheet was last found unchanged since then
+class Snapshot:
+    def __init__(self, version, records, fetched_at, source=None, model=None):
+        self.version = version
+        self.records = MappingProxyType(dict(records))
+        self.model = MappingProxyType(dict(records if model is None else model))
+        self.fetched_at = fetched_at
+        self.checked_at = fetched_at
+        self.source = MappingProxyType(dict(source or {}))
+
+    def age(self):
+        return (datetime.now() - self.checked_at).total_seconds()
+
+
+# Holds the current snapshot. It expires after ttl seconds or when invalidated.
+# After a failed refresh, background refreshes wait retry_after seconds.
+# prepare builds the model of a snapshot from its records, once, before it is published
+class SnapshotStore:
+    def __init__(self, ttl, retry_after=60, prepare=None):
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.prepare = prepare
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._version = 0
+        self._invalidated = False
+        self._failed_at = None
+        self.flight = SingleFlight()
+
+    # Latest snapshot, even if it has expired
+    def current(self):
+        return self._snapshot
+
+    # Latest snapshot, or None if there is none or it has expired
+    def get(self):
+        snapshot = self._snapshot
+        if snapshot is None or self._invalidated or snapshot.age() > self.ttl:
+            return None
+        return snapshot
+
+    def publish(self, records, fetched_at=None, source=None):
+        model = self.prepare(records) if self.prepare else None
+        with self._lock:
+            self._version += 1
+            snapshot = Snapshot(self._version, records, fetched_at or datetime.now(), source, model)
+            self._snapshot = snapshot
+            self._invalidated = False
+            self._failed_at = None
+        return snapshot
+
+    # Serve a snapshot saved by a previous process. Versions carry on from its version
+    def restore(self, snapshot):
+        if self.prepare:
+            snapshot = Snapshot(snapshot.version, snapshot.records, snapshot.fetched_at, snapshot.source,
+                                self.prepare(snapshot.records))
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = snapshot
+                self._version = max(self._version, snapshot.version)
+        return self._snapshot
+
+    def mark_failed(self):
+        self._failed_at = time.monotonic()
+
+    def can_retry(self):
+        return self._failed_at is None or time.monotonic() - self._failed_at >= self.retry_after
+
+    # Keep serving the current snapshot as if it was just fetched. Its records and version are unchanged
+    def touch(self):
+        with self._lock:
+            if self._snapshot is not None:
+                self._snapshot.checked_at = datetime.now()
+                self._invalidated = False
+                self._failed_at = None
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._invalidated = True
+
+    @property
+    def invalidated(self):
+        return self._invalidated
+
+
+# Outcome of one in-flight call, shared by everyone waiting on it
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.interrupted = False
+
+
+# Runs at most one call per key at a time. Callers arriving while it runs
+# block on the same call and share its result or exception
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    self._calls[key] = call
+                    self.calls += 1
+                else:
+                    self.coalesced += 1
+            if leader:
+                return self._lead(key, call, fn)
+            call.done.wait()
+            # The leader's script was stopped or rerun. Try again, possibly as the leader
+            if call.interrupted:
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+    def _lead(self, key, call, fn):
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as error:
+            call.error = error
+            raise
+        except BaseException:
+            call.interrupted = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def busy(self, key):
+        return key in self._calls
+
+    def stats(self):
+        return {'calls': self.calls, 'coalesced': self.coalesced, 'in_flight': len(self._calls)}
+
+
+# Grids are stored with their header as the first row, in positional columns,
+# as sheet headers need not be unique or non-empty
+def _frame_to_table(frame):
+    columns = {}
+    for j, header in enumerate(frame.columns):
+        values = [header] + frame.iloc[:, j].tolist()
+        columns[f'c{j}'] = pa.array([None if value is None else str(value) for value in values], type=pa.string())
+    return pa.table(columns)
+
+
+def _table_to_frame(table):
+    columns = [table.column(j).to_pylist() for j in range(table.num_columns)]
+    rows = [list(row) for row in zip(*columns)]
+    return pd.DataFrame(data=rows[1:], columns=rows[0])
+
+
+def _write_table(table, path):
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _read_table(path):
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+# Save a snapshot as Arrow IPC files, one per grid, with a manifest holding its
+# version and fetch time. The CURRENT pointer is swapped only once all files are written
+def save_snapshot(snapshot, directory, keep=2):
+    os.makedirs(directory, exist_ok=True)
+    name = f'{snapshot.version}-{snapshot.fetched_at.strftime("%Y%m%d%H%M%S")}'
+    path = os.path.join(directory, name)
+    os.makedirs(path, exist_ok=True)
+    manifest = {'version': snapshot.version, 'fetched_at': snapshot.fetched_at.isoformat(),
+                'source': dict(snapshot.source), 'records': {}}
+    for key, value in snapshot.records.items():
+        if isinstance(value, str):
+            manifest['records'][key] = {'text': value}
+            continue
+        frames = value if isinstance(value, list) else [value]
+        files = []
+        for index, frame in enumerate(frames):
+            file = f'{key}-{index}.arrow'
+            _write_table(_frame_to_table(frame), os.path.join(path, file))
+            files.append(file)
+        manifest['records'][key] = {'files': files, 'list': isinstance(value, list)}
+    with open(os.path.join(path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+    pointer = os.path.join(directory, 'CURRENT')
+    with open(pointer + '.tmp', 'w') as f:
+        f.write(name)
+    os.replace(pointer + '.tmp', pointer)
+    # Drop older snapshots
+    saved = sorted((entry for entry in os.listdir(directory) if entry != name and os.path.isdir(os.path.join(directory, entry))),
+                   key=lambda entry: os.path.getmtime(os.path.join(directory, entry)))
+    for entry in saved[:max(0, len(saved) - keep + 1)]:
+        shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+
+# Load the snapshot saved in a directory, or None if there is none or it cannot be read
+def load_snapshot(directory):
+    try:
+        with open(os.path.join(directory, 'CURRENT')) as f:
+            path = os.path.join(directory, f.read().strip())
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        records = {}
+        for key, entry in manifest['records'].items():
+            if 'text' in entry:
+                records[key] = entry['text']
+                continue
+            frames = [_table_to_frame(_read_table(os.path.join(path, file))) for file in entry['files']]
+            records[key] = frames if entry['list'] else frames[0]
+        return Snapshot(manifest['version'], records, datetime.fromisoformat(manifest['fetched_at']),
+                        manifest.get('source'))
+    except Exception:
+        return None
@@ -1,6 +1,14 @@
 import streamlit as st
 from helpers import *
-from datetime import date
+
+
+# Keep the shared records warm in the background
+start_refresher()
+start_metrics_log()
+
+
+# Profile this rerun if asked to
+start_rerun_profile()
 
 
 # Initialize session state variables
@@ -24,6 +32,8 @@ if 'student_scores' not in st.session_state:
     st.session_state.student_scores = 0
 if 'access' not in st.session_state:
     st.session_state.access = False
+if 'snapshot_version' not in st.session_state:
+    st.session_state.snapshot_version = 0
 
 
 # Title of the app
@@ -32,7 +42,7 @@ st.title('The House of Mirrors')
 
 # Ask for password
 if not st.session_state.authenticated:
-    st.image('images/You shall not pass.jpg')
+    st.image(asset_registry().data('You shall not pass.jpg'))
     password = st.text_input("Passphrase")
     st.warning(''' To reflect on your reflections, say the magic words. ''', icon="🧙‍♂️")
     # Check if password is correct
@@ -41,7 +51,40 @@ if not st.session_state.authenticated:
         st.rerun()
     else:
         signatures()
-        st.stop()
+        stop_rerun('passphrase')
+
+
+# Admin can expire the shared records so that the next visitor fetches fresh ones
+if 'admin_key' in st.secrets and st.query_params.get('invalidate') == st.secrets['admin_key']:
+    snapshot_store().invalidate()
+    del st.query_params['invalidate']
+
+
+# Operator stats for admins
+if 'admin_key' in st.secrets and st.query_params.get('stats') == st.secrets['admin_key']:
+    render_operator_stats()
+    stop_rerun('stats')
+
+
+# Metrics for admins
+if 'admin_key' in st.secrets and st.query_params.get('metrics') == st.secrets['admin_key']:
+    render_metrics()
+    stop_rerun('metrics')
+
+
+# Eligibility export for admins
+if 'admin_key' in st.secrets and st.query_params.get('export') == st.secrets['admin_key']:
+    render_eligibility_export()
+    stop_rerun('export')
+
+
+# Follow the shared records. Expired records are refreshed in the background
+if st.session_state.data_pulled:
+    snapshot = current_snapshot()
+    if snapshot is None:
+        st.session_state.data_pulled = False
+    elif snapshot.version != st.session_state.snapshot_version:
+        use_snapshot(snapshot)
 
 
 # Fetch data
@@ -54,10 +97,9 @@ if not st.session_state.data_pulled:
             load_data = load_student_data()
             if not load_data or not st.session_state.data_pulled:
                 raise Exception
-            st.session_state.data_date = date.today().strftime("%d/%m/%Y")
         except:
             failed_to_fetch()
-            st.stop() 
+            stop_rerun('fetch-failed')
     st.rerun()
 
 
@@ -91,7 +133,7 @@ if not st.session_state.valid_roll_number and st.session_state.data_pulled:
 
 # Show student record for roll number
 if st.session_state.valid_roll_number and st.session_state.data_pulled:
-    st.session_state.eligible = True
+    st.session_state.eligible = bool(student_view(roll_number).eligibility['Eligible'])
     
     eligibility_banner = st.empty()
 
@@ -134,3 +176,7 @@ if st.session_state.valid_roll_number and st.session_state.data_pulled and st.se
         with eligibility_banner.container():
             render_eligibility()
 
+
+# Save the profile of this rerun, if it is profiled
+finish_rerun_profile(roll_number)
+
@@ -0,0 +1,44 @@
+import threading
+from collections import OrderedDict
+
+
+# Everything the student pages show for one roll number of one snapshot.
+# Views are shared between sessions, so renderers only read them
+class StudentView:
+    __slots__ = ('roll_number', 'name', 'reg_no', 'access', 'house', 'house_index', 'house_points',
+                 'attendance', 'eligibility', 'score_labels', 'scores', 'news_scores',
+                 'theory_scores', 'practical_scores')
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+
+# Least recently used cache of built values, bounded to size entries
+class ViewCache:
+    def __init__(self, size=512):
+        self.size = size
+        self._lock = threading.Lock()
+        self._views = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # Cached value of key, built with build on a miss
+    def get(self, key, build):
+        with self._lock:
+            view = self._views.get(key)
+            if view is not None:
+                self._views.move_to_end(key)
+                self.hits += 1
+                return view
+            self.misses += 1
+        view = build()
+        with self._lock:
+            self._views[key] = view
+            self._views.move_to_end(key)
+            while len(self._views) > self.size:
+                self._views.popitem(last=False)
+        return view
+
+    def stats(self):
+        return {'views': len(self._views), 'size': self.size, 'hits': self.hits, 'misses': self.misses}